@@ -5,21 +5,31 @@
 # - [Stability] user_db 초기화 로직 보강 (잠깨기 후 연결 지연 시 에러 방지)
 
 import streamlit as st
-import pandas as pd
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
 import io
 import json
 import time
 import datetime
 import re
 import os
+import sys
 import math
 import calendar
 import hashlib
 import base64
-from dateutil import parser
+import threading
+import queue
+import functools
+import logging
+from contextlib import contextmanager, nullcontext
+from collections import namedtuple, deque
+from types import MappingProxyType
+
+# 백그라운드 스레드(예열·프리페치)에서도 같은 폴더의 leave_parser·storage 를 import 할 수 있도록
+# (streamlit 은 스크립트 실행 중에만 sys.path[0] 에 스크립트 폴더를 넣었다가 빼는 경우가 있으므로 뒤쪽에 따로 추가)
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+if APP_DIR not in sys.path[1:]: sys.path.append(APP_DIR)
+
+from storage import DriveStorage, GuardedStorage, LocalStorage, StorageError, write_atomic
 
 # ==============================================================================
 # 0. 버전 관리
@@ -31,21 +41,23 @@ APP_VERSION = "Ver 5.8"
 # ==============================================================================
 st.set_page_config(page_title="옥션원 서울지사 연차확인", layout="centered", page_icon="🌸")
 
-st.markdown(f"""
-    <style>
+# 스타일시트와 이미지는 한 번만 최적화해 static/ 에 내용 해시 파일명으로 두고 URL 로 참조
+# (매 rerun 마다 CSS 전체와 base64 이미지를 웹소켓으로 다시 보내지 않음, 브라우저는 한 번 받아 캐시)
+# 정적 서빙이 꺼져 있거나 static/ 에 쓸 수 없으면 인라인 <style> / data URI 로 대체
+APP_CSS = """
     @import url("https://cdn.jsdelivr.net/gh/orioncactus/pretendard@v1.3.9/dist/web/static/pretendard.min.css");
     
-    [data-testid="stAppViewContainer"] {{ background-color: #F8F9FA; font-family: 'Pretendard', sans-serif; }}
+    [data-testid="stAppViewContainer"] { background-color: #F8F9FA; font-family: 'Pretendard', sans-serif; }
 
-    .block-container {{
+    .block-container {
         max-width: 480px; 
         padding-top: 2rem; 
         padding-bottom: 2rem;
         margin: auto; background-color: #ffffff;
         box-shadow: 0 10px 30px rgba(0,0,0,0.08); border-radius: 24px; min-height: 95vh;
-    }}
+    }
 
-    .version-badge {{
+    .version-badge {
         width: 100%;
         text-align: right; 
         color: #adb5bd;
@@ -55,9 +67,9 @@ st.markdown(f"""
         padding-right: 15px; 
         padding-top: 10px;
         display: block;
-    }}
+    }
 
-    .renewal-box {{
+    .renewal-box {
         background-color: #F0F8FF;
         border: 2px solid #E1E8ED;
         border-radius: 20px;
@@ -65,185 +77,888 @@ st.markdown(f"""
         text-align: center;
         margin-top: 20px;
         margin-bottom: 20px;
-    }}
-    .renewal-number {{ font-size: 3.5rem; color: #5D9CEC; font-weight: 900; line-height: 1.2; }}
-    .renewal-label {{ font-size: 1.1rem; color: #555; font-weight: 700; margin-top: 5px; }}
+    }
+    .renewal-number { font-size: 3.5rem; color: #5D9CEC; font-weight: 900; line-height: 1.2; }
+    .renewal-label { font-size: 1.1rem; color: #555; font-weight: 700; margin-top: 5px; }
 
-    .stToggle {{ background-color: #f8f9fa; border: 1px solid #e9ecef; border-radius: 12px; padding: 12px 0px; margin: 10px 0; display: flex !important; justify-content: center !important; align-items: center !important; }}
-    div[data-testid="stWidgetLabel"] {{ margin-right: 8px; padding-bottom: 0px !important; }}
+    .stToggle { background-color: #f8f9fa; border: 1px solid #e9ecef; border-radius: 12px; padding: 12px 0px; margin: 10px 0; display: flex !important; justify-content: center !important; align-items: center !important; }
+    div[data-testid="stWidgetLabel"] { margin-right: 8px; padding-bottom: 0px !important; }
     
-    .metric-box {{ display: flex; justify-content: space-between; align-items: center; background-color: #fff; border: 1px solid #eee; border-radius: 16px; padding: 22px 15px; box-shadow: 0 4px 12px rgba(0,0,0,0.03); margin-bottom: 20px; }}
-    .metric-item {{ flex: 1; display: flex; flex-direction: column; align-items: center; justify-content: center; }}
-    .metric-label {{ font-size: 0.9rem; color: #888; font-weight: 600; margin-bottom: 8px; }}
-    .metric-value-large {{ font-size: 2.6rem; color: #5D9CEC; font-weight: 900; line-height: 1; }}
-    .metric-value-sub {{ font-size: 1.1rem; color: #000; font-weight: 700; text-align: center; }}
-    .metric-divider {{ width: 1px; height: 50px; background-color: #eee; margin: 0 5px; }}
-
-    .login-header {{ text-align: center; margin-top: 20px; margin-bottom: 30px; }}
-    .login-title {{ font-size: 2.2rem; font-weight: 800; color: #5D9CEC; line-height: 1.3; }}
-    .login-icon-img {{ width: 50px; height: 50px; margin-bottom: 15px; display: block; margin-left: auto; margin-right: auto; }}
+    .metric-box { display: flex; justify-content: space-between; align-items: center; background-color: #fff; border: 1px solid #eee; border-radius: 16px; padding: 22px 15px; box-shadow: 0 4px 12px rgba(0,0,0,0.03); margin-bottom: 20px; }
+    .metric-item { flex: 1; display: flex; flex-direction: column; align-items: center; justify-content: center; }
+    .metric-label { font-size: 0.9rem; color: #888; font-weight: 600; margin-bottom: 8px; }
+    .metric-value-large { font-size: 2.6rem; color: #5D9CEC; font-weight: 900; line-height: 1; }
+    .metric-value-sub { font-size: 1.1rem; color: #000; font-weight: 700; text-align: center; }
+    .metric-divider { width: 1px; height: 50px; background-color: #eee; margin: 0 5px; }
+
+    .login-header { text-align: center; margin-top: 20px; margin-bottom: 30px; }
+    .login-title { font-size: 2.2rem; font-weight: 800; color: #5D9CEC; line-height: 1.3; }
+    .login-icon-img { width: 50px; height: 50px; margin-bottom: 15px; display: block; margin-left: auto; margin-right: auto; }
     
-    .profile-card {{ display: grid; grid-template-columns: 1.4fr 1fr; background-color: #F0F8FF; border-radius: 20px; overflow: hidden; margin-bottom: 15px; height: 160px; border: 1px solid #E1E8ED; }}
-    .card-text {{ padding: 20px; display: flex; flex-direction: column; justify-content: center; }}
-    .card-image img {{ width: 100%; height: 100%; object-fit: cover; object-position: top center; }}
-    .hello-text {{ font-size: 1rem; color: #555; margin-bottom: 4px; font-weight: 500; }}
-    .name-text {{ font-size: 1.6rem; color: #333; font-weight: 900; line-height: 1.3; word-break: keep-all; }}
-    .name-highlight {{ color: #5D9CEC; }}
-    .msg-text {{ font-size: 0.85rem; color: #777; margin-top: 5px; }}
-
-    .stTabs [data-baseweb="tab-list"] {{ gap: 8px; margin-bottom: 0px; }}
-    .stTabs [data-baseweb="tab"] {{ height: 44px; border-radius: 12px; font-weight: 700; flex: 1; }}
-    .stTabs [aria-selected="true"] {{ color: #5D9CEC !important; background-color: #F0F8FF !important; }}
-
-    .stButton button {{ border-radius: 10px; font-weight: 700; font-size: 0.9rem; padding: 0.7rem 0; width: 100%; }}
-    button[kind="primary"] {{ background-color: #5D9CEC !important; border: none !important; color: white !important; }}
+    .profile-card { display: grid; grid-template-columns: 1.4fr 1fr; background-color: #F0F8FF; border-radius: 20px; overflow: hidden; margin-bottom: 15px; height: 160px; border: 1px solid #E1E8ED; }
+    .card-text { padding: 20px; display: flex; flex-direction: column; justify-content: center; }
+    .card-image img { width: 100%; height: 100%; object-fit: cover; object-position: top center; }
+    .hello-text { font-size: 1rem; color: #555; margin-bottom: 4px; font-weight: 500; }
+    .name-text { font-size: 1.6rem; color: #333; font-weight: 900; line-height: 1.3; word-break: keep-all; }
+    .name-highlight { color: #5D9CEC; }
+    .msg-text { font-size: 0.85rem; color: #777; margin-top: 5px; }
+
+    .stTabs [data-baseweb="tab-list"] { gap: 8px; margin-bottom: 0px; }
+    .stTabs [data-baseweb="tab"] { height: 44px; border-radius: 12px; font-weight: 700; flex: 1; }
+    .stTabs [aria-selected="true"] { color: #5D9CEC !important; background-color: #F0F8FF !important; }
+
+    .stButton button { border-radius: 10px; font-weight: 700; font-size: 0.9rem; padding: 0.7rem 0; width: 100%; }
+    button[kind="primary"] { background-color: #5D9CEC !important; border: none !important; color: white !important; }
     
-    .realtime-badge {{ background-color: #FFF0F0; color: #FF6B6B; padding: 5px 12px; border-radius: 20px; font-size: 0.8rem; font-weight: 800; display: inline-block; margin-bottom: 5px; }}
-    .stale-badge {{ background-color: #F1F3F5; color: #868E96; padding: 5px 12px; border-radius: 20px; font-size: 0.8rem; font-weight: 800; display: inline-block; margin-bottom: 10px; }}
-    .stTextInput input {{ text-align: center; }}
-    .viewing-alert {{ background-color: #fff3cd; color: #856404; padding: 8px; border-radius: 8px; text-align: center; font-size: 0.85rem; font-weight: bold; margin-bottom: 15px; border: 1px solid #ffeeba; }}
+    .realtime-badge { background-color: #FFF0F0; color: #FF6B6B; padding: 5px 12px; border-radius: 20px; font-size: 0.8rem; font-weight: 800; display: inline-block; margin-bottom: 5px; }
+    .stale-badge { background-color: #F1F3F5; color: #868E96; padding: 5px 12px; border-radius: 20px; font-size: 0.8rem; font-weight: 800; display: inline-block; margin-bottom: 10px; }
+    .stTextInput input { text-align: center; }
+    .viewing-alert { background-color: #fff3cd; color: #856404; padding: 8px; border-radius: 8px; text-align: center; font-size: 0.85rem; font-weight: bold; margin-bottom: 15px; border: 1px solid #ffeeba; }
     
-    .special-rule-box {{ color: #5D9CEC; font-weight: 800; margin-top: 15px; background-color: #F0F8FF; padding: 15px; border-radius: 12px; border: 1px solid #5D9CEC; text-align: center; line-height: 1.5; font-size: 0.95rem; }}
-    .update-time-caption {{ text-align: left; color: #868e96; font-size: 0.8rem; margin-bottom: 15px; margin-left: 5px; font-weight: 600; letter-spacing: -0.5px; }}
+    .special-rule-box { color: #5D9CEC; font-weight: 800; margin-top: 15px; background-color: #F0F8FF; padding: 15px; border-radius: 12px; border: 1px solid #5D9CEC; text-align: center; line-height: 1.5; font-size: 0.95rem; }
+    .update-time-caption { text-align: left; color: #868e96; font-size: 0.8rem; margin-bottom: 15px; margin-left: 5px; font-weight: 600; letter-spacing: -0.5px; }
     
-    /* [Ver 5.8 수정] 중괄호 두 번 {{ }} 사용하여 에러 완벽 해결 */
-    .bottom-spacer {{ height: 150px; background-color: transparent; }}
-    </style>
-    """, unsafe_allow_html=True)
+    /* [Ver 5.8] 하단 여백 */
+    .bottom-spacer { height: 150px; background-color: transparent; }
+"""
+
+STATIC_DIR = os.path.join(APP_DIR, "static")
+# 원본 → 최대 (가로, 세로): 480px 레이아웃에서 표시 크기의 2배 (고해상도 화면 대응)
+IMAGE_VARIANTS = {"character.png": (600, 320), "empty_calendar.png": (100, 100)}
+WEBP_QUALITY = 80
+StaticAssets = namedtuple('StaticAssets', ['images', 'stylesheet'])
+
+@st.cache_resource(show_spinner=False)
+def get_static_assets():
+    serve = False
+    try: serve = bool(st.get_option("server.enableStaticServing"))
+    except: pass
+    images = {name: _image_asset(name, size, serve) for name, size in IMAGE_VARIANTS.items()}
+    href = publish_static("style", "css", APP_CSS.encode('utf-8')) if serve else None
+    stylesheet = f'<link rel="stylesheet" href="{href}">' if href else f"<style>{APP_CSS}</style>"
+    return StaticAssets(MappingProxyType(images), stylesheet)
+
+def publish_static(stem, ext, data):
+    # static/{stem}.{내용 해시}.{ext} : 내용이 바뀌면 URL 도 바뀌므로 브라우저 캐시를 믿고 써도 됨
+    filename = f"{stem}.{hashlib.md5(data).hexdigest()[:10]}.{ext}"
+    path = os.path.join(STATIC_DIR, filename)
+    try:
+        if not os.path.exists(path):
+            os.makedirs(STATIC_DIR, exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f: f.write(data)
+            os.replace(tmp, path)
+        return f"app/static/{filename}"
+    except: return None
+
+def _image_asset(name, size, serve):
+    try:
+        with open(os.path.join(APP_DIR, name), "rb") as f: data = f.read()
+    except: return ""
+    mime = "image/png"
+    try:
+        from PIL import Image
+        img = Image.open(io.BytesIO(data))
+        img.thumbnail(size, Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, "WEBP", quality=WEBP_QUALITY, method=6)
+        data, mime = out.getvalue(), "image/webp"
+    except: pass
+    url = publish_static(os.path.splitext(name)[0], mime.split('/')[1], data) if serve else None
+    return url or f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+ASSETS = get_static_assets()
+st.markdown(ASSETS.stylesheet, unsafe_allow_html=True)
 
 # ==============================================================================
-# 2. 구글 드라이브 & 유틸리티
+# 2. 저장소 (구글 드라이브 / 로컬 폴더) & 유틸리티
 # ==============================================================================
-try:
-    FOLDER_ID = st.secrets["FOLDER_ID"]
-    SCOPES = ['https://www.googleapis.com/auth/drive']
-except:
-    st.error("Secrets 설정 확인 필요")
-    st.stop()
+def get_config(name, default=None):
+    # 환경 변수 우선, 없으면 secrets
+    value = os.environ.get(name)
+    if value: return value
+    try: return st.secrets[name]
+    except: return default
+
+# 계측: 구간별 소요 시간(span)과 캐시 호출/미스 카운터를 프로세스 단위로 모으고 JSON 한 줄 로그(logger "pto")로 출력
+# PTO_METRICS=1 일 때 수집 (관리자 진단 탭에서 켜고 끌 수 있음), 꺼져 있으면 span() 은 빈 context manager 만 반환
+METRICS_RECENT = 200
+
+@st.cache_resource
+def get_metrics():
+    logger = logging.getLogger("pto")
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return {'enabled': str(get_config("PTO_METRICS", "")).lower() in ("1", "true", "on"),
+            'lock': threading.Lock(), 'logger': logger, 'since': time.time(),
+            'spans': {}, 'caches': {}, 'recent': deque(maxlen=METRICS_RECENT)}
+
+METRICS = get_metrics()
+NO_SPAN = nullcontext()
+
+def span(name, **fields):
+    return _timed(name, fields) if METRICS['enabled'] else NO_SPAN
+
+def timed(name):
+    # 함수 전체를 span 으로 감싸는 데코레이터 (fragment 단독 rerun 도 집계되도록)
+    def wrap(func):
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            with span(name): return func(*args, **kwargs)
+        return inner
+    return wrap
+
+@contextmanager
+def _timed(name, fields):
+    start = time.perf_counter()
+    error = None
+    try: yield
+    except BaseException as e:
+        # st.rerun()/st.stop() 의 제어 흐름 예외는 오류로 세지 않음
+        if type(e).__name__ not in ("RerunException", "StopException"): error = f"{type(e).__name__}: {e}"[:200]
+        raise
+    finally: record_span(name, (time.perf_counter() - start) * 1000, error, fields)
+
+def record_span(name, ms, error, fields):
+    entry = {'ts': datetime.datetime.utcnow().isoformat(timespec='milliseconds') + 'Z', 'span': name, 'ms': round(ms, 1), **fields}
+    if error: entry['error'] = error
+    with METRICS['lock']:
+        s = METRICS['spans'].setdefault(name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'errors': 0})
+        s['count'] += 1
+        s['total_ms'] += ms
+        s['max_ms'] = max(s['max_ms'], ms)
+        if error: s['errors'] += 1
+        METRICS['recent'].append(entry)
+    METRICS['logger'].info(json.dumps(entry, ensure_ascii=False, default=str))
+
+def _cache_stats(name):
+    # METRICS['lock'] 을 잡은 상태에서 호출
+    return METRICS['caches'].setdefault(name, {'calls': 0, 'misses': 0, 'recomputes': 0, 'keys': set()})
+
+def record_cache_call(name):
+    with METRICS['lock']: _cache_stats(name)['calls'] += 1
+
+def record_cache_miss(name, key=None):
+    # 이미 계산했던 키가 다시 계산되면 재계산(만료·축출·clear)으로 집계
+    with METRICS['lock']:
+        c = _cache_stats(name)
+        c['misses'] += 1
+        if key is None: return
+        if key in c['keys']: c['recomputes'] += 1
+        else: c['keys'].add(key)
+
+def tracked(cache_decorator, on_error=None):
+    # @tracked(st.cache_data(...)) : 호출 수와 실제 계산(미스) 수를 세고 계산 구간을 span 으로 기록
+    # on_error: 계산이 저장소 오류로 실패했을 때 돌려줄 빈 값을 만드는 함수 (예외는 캐시되지 않으므로 다음 호출에서 다시 시도)
+    #           .strict 는 예외를 그대로 올리는 호출 (백그라운드 재검증용)
+    def wrap(func):
+        name = func.__name__
+        @functools.wraps(func)
+        def compute(*args, **kwargs):
+            if METRICS['enabled']:
+                try: key = hash((args, tuple(sorted(kwargs.items()))))
+                except TypeError: key = None
+                record_cache_miss(name, key)
+            with span(f"compute.{name}"): return func(*args, **kwargs)
+        cached = cache_decorator(compute)
+        @functools.wraps(func)
+        def strict(*args, **kwargs):
+            if METRICS['enabled']: record_cache_call(name)
+            return cached(*args, **kwargs)
+        if on_error is None: call = strict
+        else:
+            @functools.wraps(func)
+            def call(*args, **kwargs):
+                try: return strict(*args, **kwargs)
+                except StorageError: return on_error()
+        call.strict = strict
+        call.clear = cached.clear
+        return call
+    return wrap
+
+def metrics_tables():
+    import pandas as pd
+    with METRICS['lock']:
+        spans = [(n, s['count'], s['total_ms'] / s['count'], s['max_ms'], s['errors']) for n, s in METRICS['spans'].items()]
+        caches = [(n, c['calls'], c['calls'] - c['misses'], c['misses'], c['recomputes']) for n, c in METRICS['caches'].items()]
+        recent = list(METRICS['recent'])
+    span_df = pd.DataFrame(spans, columns=['구간', '횟수', '평균(ms)', '최대(ms)', '오류']).sort_values('평균(ms)', ascending=False)
+    cache_df = pd.DataFrame(caches, columns=['캐시', '호출', '적중', '미스', '재계산']).sort_values('캐시')
+    cache_df['적중률'] = (cache_df['적중'] / cache_df['호출'].where(cache_df['호출'] > 0)).round(3)
+    return span_df.round(1), cache_df, recent
+
+def reset_metrics():
+    with METRICS['lock']:
+        METRICS['spans'].clear(); METRICS['caches'].clear(); METRICS['recent'].clear()
+        METRICS['since'] = time.time()
+
+# PTO_STORAGE = "drive"(기본) | "local" (PTO_LOCAL_DIR: 드라이브 폴더를 동기화한 로컬 디렉터리, 테스트용 가짜 폴더)
+# PTO_LOCAL_LATENCY: local 저장소 호출마다 넣을 지연(ms) — 부하 테스트에서 드라이브 왕복 시간을 흉내 (tests/load_test.py)
+STORAGE_BACKEND = get_config("PTO_STORAGE", "drive")
+LOCAL_STORAGE_DIR = get_config("PTO_LOCAL_DIR", "")
+LOCAL_STORAGE_LATENCY = float(get_config("PTO_LOCAL_LATENCY", "0")) / 1000
+FOLDER_ID = None
+SCOPES = ['https://www.googleapis.com/auth/drive']
+if STORAGE_BACKEND == "local":
+    if not LOCAL_STORAGE_DIR or not os.path.isdir(LOCAL_STORAGE_DIR):
+        st.error("로컬 저장소 경로 확인 필요 (PTO_LOCAL_DIR)")
+        st.stop()
+else:
+    try: FOLDER_ID = st.secrets["FOLDER_ID"]
+    except:
+        st.error("Secrets 설정 확인 필요")
+        st.stop()
+
+# httplib2 클라이언트는 스레드 간 공유가 안전하지 않으므로, 클라이언트를 풀에서 빌려 쓰고 반납
+# (각 클라이언트는 자기 httplib2 연결을 keep-alive 로 재사용, 자격 증명은 프로세스에 1개)
+DRIVE_POOL_SIZE = 8
+DRIVE_HTTP_TIMEOUT = 30
 
 @st.cache_resource
-def get_drive_service():
+def get_drive_pool():
+    creds = None
     try:
+        # 무거운 구글 API 모듈은 로그인 화면 렌더링을 막지 않도록 실제로 필요할 때 import
+        from google.oauth2 import service_account
         creds_dict = st.secrets["gcp_service_account"]
         creds = service_account.Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-        return build('drive', 'v3', credentials=creds, cache_discovery=False)
-    except: return None
+    except: pass
+    return {'creds': creds, 'idle': queue.LifoQueue(maxsize=DRIVE_POOL_SIZE), 'lock': threading.Lock()}
+
+def refresh_drive_credentials(pool):
+    # 만료 시 한 스레드만 토큰을 갱신 (AuthorizedHttp 가 요청마다 제각각 갱신하지 않도록)
+    creds = pool['creds']
+    if creds.valid: return
+    with pool['lock']:
+        if not creds.valid:
+            import httplib2
+            import google_auth_httplib2
+            creds.refresh(google_auth_httplib2.Request(httplib2.Http(timeout=DRIVE_HTTP_TIMEOUT)))
+
+def build_drive_service(creds):
+    import httplib2
+    import google_auth_httplib2
+    from googleapiclient.discovery import build
+    http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=DRIVE_HTTP_TIMEOUT))
+    return build('drive', 'v3', http=http, cache_discovery=False)
+
+@contextmanager
+def drive_session():
+    pool = get_drive_pool()
+    service = None
+    if pool['creds'] is not None:
+        try:
+            refresh_drive_credentials(pool)
+            try: service = pool['idle'].get_nowait()
+            except queue.Empty: service = build_drive_service(pool['creds'])
+        except: service = None
+    try: yield service
+    finally:
+        if service is not None:
+            try: pool['idle'].put_nowait(service)
+            except queue.Full: pass
 
 def get_file_sort_key(filename):
     match = re.search(r'(\d{4})_(\d+)', filename)
     if match: return (int(match.group(1)), int(match.group(2)))
     return (0, 0)
 
-@st.cache_data(ttl=60)
-def get_all_files():
-    service = get_drive_service()
-    if not service: return None, None, None, [], None
+def get_file_version(meta):
+    # 내용 기반 md5 우선, 없으면(구글 문서 등) 수정 시각으로 버전 판별
+    if not meta: return ""
+    return meta.get('md5Checksum') or meta.get('modifiedTime', "")
+
+# 저장소 백엔드·보호 계층은 storage.py (드라이브 클라이언트 풀과 설정만 여기서 주입)
+STORAGE_CALL_TIMEOUT = float(get_config("PTO_STORAGE_TIMEOUT", "20"))  # 초, 호출 하나의 제한 시간
+
+@st.cache_resource
+def get_storage():
+    backend = LocalStorage(LOCAL_STORAGE_DIR, LOCAL_STORAGE_LATENCY) if STORAGE_BACKEND == "local" else DriveStorage(FOLDER_ID, drive_session)
+    return GuardedStorage(backend, timeout=STORAGE_CALL_TIMEOUT, workers=DRIVE_POOL_SIZE)
+
+# ==============================================================================
+# 2-1. 디스크 스냅샷 (잠깨기 후 첫 요청을 드라이브 대신 로컬 디스크에서 응답)
+# ==============================================================================
+# 파싱된 표는 Parquet, JSON 은 그대로 저장하고 manifest.json 에 각 항목을 만든 드라이브 버전을 기록
+SNAPSHOT_DIR = get_config("PTO_SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshot"))
+
+@st.cache_resource
+def get_snapshot_state():
+    # 프로세스 시작 시 한 번만 매니페스트를 읽음
+    manifest = {}
+    try:
+        with open(os.path.join(SNAPSHOT_DIR, "manifest.json"), encoding="utf-8") as f: manifest = json.load(f)
+    except: pass
+    return {'manifest': manifest, 'lock': threading.Lock()}
+
+def snapshot_key(kind, file_id, filename=None):
+    key = f"{kind}__{file_id}"
+    if filename: key += "__" + hashlib.md5(filename.encode('utf-8')).hexdigest()[:8]
+    return key
+
+def read_snapshot(key, version, ext):
+    data = _read_snapshot(key, version, ext)
+    if METRICS['enabled']:
+        record_cache_call("snapshot")
+        if data is None: record_cache_miss("snapshot")
+    return data
+
+def _read_snapshot(key, version, ext):
+    state = get_snapshot_state()
+    if not version or state['manifest'].get(key) != version: return None
+    path = os.path.join(SNAPSHOT_DIR, f"{key}.{ext}")
+    try:
+        with span("snapshot.read", key=key):
+            if ext == "parquet":
+                import pandas as pd
+                return pd.read_parquet(path)
+            with open(path, encoding="utf-8") as f: return json.load(f)
+    except: return None
+
+def write_snapshot(key, version, data, ext):
+    if not version: return
+    state = get_snapshot_state()
+    path = os.path.join(SNAPSHOT_DIR, f"{key}.{ext}")
     try:
-        query = f"'{FOLDER_ID}' in parents and trashed=false"
-        results = service.files().list(q=query, fields="files(id, name, modifiedTime)").execute()
-        all_files = results.get('files', [])
-        user_db_id, renewal_id, realtime_id = None, None, None
-        realtime_meta = None
-        monthly_files = []
-        for f in all_files:
-            name = f['name']
-            if name == "user_db.json": user_db_id = f['id']
-            elif name == "realtime_usage.json": 
-                realtime_id = f['id']
-                realtime_meta = f
-            elif "renewal" in name or "갱신" in name: renewal_id = f['id']
-            elif ".xlsx" in name: monthly_files.append(f)
-        monthly_files.sort(key=lambda x: get_file_sort_key(x['name']), reverse=True)
-        return user_db_id, renewal_id, realtime_id, monthly_files, realtime_meta
-    except: return None, None, None, [], None
-
-@st.cache_data(ttl=60)
-def load_json_file(file_id):
-    service = get_drive_service()
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        with state['lock']:
+            if ext == "parquet": write_atomic(path, lambda p: data.to_parquet(p, index=False))
+            else: write_atomic(path, lambda p: _dump_json(p, data))
+            state['manifest'][key] = version
+            write_atomic(os.path.join(SNAPSHOT_DIR, "manifest.json"), lambda p: _dump_json(p, state['manifest']))
+    except: pass
+
+def _dump_json(path, data):
+    with open(path, "w", encoding="utf-8") as f: json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+# 폴더 목록(가벼운 호출)만 주기적으로 갱신하고, 파일 내용 캐시는 (file_id, version) 으로 키를 잡아
+# 실제로 바뀐 파일만 다시 내려받음
+# 목록 = (user_db_id, renewal_id, realtime_id, monthly_files, realtime_meta, file_versions, rules_id)
+EMPTY_CATALOG = (None, None, None, [], None, {}, None)
+ACCRUAL_RULES_FILE = "accrual_rules.json"
+CATALOG_TTL = 60  # 초
+CATALOG_RETRY = 10  # 초, 갱신 실패 후 다음 시도까지
+
+# stale-while-revalidate: 스크립트는 항상 마지막으로 확정된 목록을 바로 받고, TTL 이 지났으면 백그라운드에서
+# 목록을 다시 읽어 바뀐 파일을 먼저 내려받은 뒤에 목록을 교체 → 드라이브가 느리거나 끊겨도 사용자는 직전 데이터를 봄
+# 바뀐 파일을 못 읽으면 그 파일만 이전 메타데이터(=이전 버전, 캐시에 있는 값)로 남겨 두고 다음 갱신에서 다시 시도
+@st.cache_resource
+def get_catalog_state():
+    return {'lock': threading.Lock(), 'refresh_lock': threading.Lock(), 'catalog': None,
+            'fetched': 0.0, 'checked': 0.0, 'refreshing': False, 'stale': (), 'error': None}
+
+def get_all_files():
+    state = get_catalog_state()
+    if METRICS['enabled']: record_cache_call("catalog")
+    if state['catalog'] is None:
+        # 콜드 스타트: 디스크의 마지막 목록이 있으면 즉시 응답(fetched=0 이라 바로 재검증), 없을 때만 드라이브를 기다림
+        snapshot = read_snapshot("catalog", get_snapshot_state()['manifest'].get("catalog"), "json")
+        if snapshot and len(snapshot) == len(EMPTY_CATALOG):
+            with state['lock']:
+                if state['catalog'] is None: state['catalog'] = tuple(snapshot)
+        else:
+            if METRICS['enabled']: record_cache_miss("catalog")
+            return refresh_catalog() or EMPTY_CATALOG
+    now = time.time()
+    if now - state['fetched'] > CATALOG_TTL and now - state['checked'] > CATALOG_RETRY: refresh_catalog_async()
+    return state['catalog']
+
+def refresh_catalog_async():
+    state = get_catalog_state()
+    with state['lock']:
+        if state['refreshing']: return
+        state['refreshing'] = True
+    def run():
+        try: refresh_catalog()
+        finally: state['refreshing'] = False
+    threading.Thread(target=run, name="pto-catalog", daemon=True).start()
+
+def refresh_catalog():
+    # 한 번에 하나만 갱신 (기다리는 동안 다른 스레드가 끝냈으면 그 결과 사용), 실패하면 기존 목록 그대로 반환
+    state = get_catalog_state()
+    requested = time.time()
+    with state['refresh_lock']:
+        if state['fetched'] >= requested: return state['catalog']
+        state['checked'] = time.time()
+        try:
+            with span("storage.list", backend=STORAGE_BACKEND): files = get_storage().list_files()
+        except StorageError as e:
+            state['error'] = str(e)
+            return state['catalog']
+        index_sidecars(files)
+        catalog = build_catalog(files)
+        previous = state['catalog']
+        if previous is not None:
+            with span("catalog.revalidate"): catalog, stale = settle_catalog(previous, catalog)
+        else: stale = ()
+        write_snapshot("catalog", datetime.datetime.utcnow().isoformat(), list(catalog), "json")
+        with state['lock']:
+            state['catalog'], state['fetched'], state['stale'], state['error'] = catalog, time.time(), stale, None
+        if SIDECARS_ENABLED: start_sidecar_conversion()
+        return catalog
+
+def settle_catalog(previous, catalog):
+    # 새 목록에서 버전이 바뀐(또는 새로 생긴) 파일을 미리 읽어 캐시를 채움
+    # 읽지 못한 파일은 이전 목록의 메타데이터로 되돌림 → (확정 목록, 되돌린 파일 id 목록)
+    user_db_id, renewal_id, realtime_id, monthly_files, realtime_meta, versions, rules_id = catalog
+    old_versions = previous[5]
+    changed = [file_id for file_id, version in versions.items() if old_versions.get(file_id) != version]
+    loaders = {user_db_id: load_json_file, realtime_id: load_json_file, rules_id: load_json_file}
+    failed = []
+    for file_id in changed:
+        try:
+            if file_id in loaders: loaders[file_id].strict(file_id, versions[file_id])
+            elif file_id == renewal_id: fetch_excel.strict(file_id, versions[file_id], is_renewal=True)
+            elif any(f['id'] == file_id for f in monthly_files): get_usage_matrix.strict(file_id, versions[file_id])
+        except StorageError: failed.append(file_id)
+    if not failed: return catalog, ()
+    old_monthly = {f['id']: f for f in previous[3]}
+    versions = {**versions, **{i: old_versions[i] for i in failed if i in old_versions}}
+    monthly_files = [old_monthly[f['id']] if f['id'] in failed and f['id'] in old_monthly else f for f in monthly_files]
+    if realtime_id in failed and previous[4]: realtime_meta = previous[4]
+    return (user_db_id, renewal_id, realtime_id, monthly_files, realtime_meta, versions, rules_id), tuple(failed)
+
+def patch_catalog_version(file_id, meta):
+    # 직접 쓴 파일(사용자 DB)은 목록을 다시 읽지 않고 확정 목록의 버전만 바꿈
+    state = get_catalog_state()
+    with state['lock']:
+        if state['catalog'] is None: return
+        catalog = list(state['catalog'])
+        catalog[5] = {**catalog[5], file_id: get_file_version(meta)}
+        state['catalog'] = tuple(catalog)
+
+def build_catalog(all_files):
+    from leave_parser import SIDECAR_SUFFIX, is_renewal_name
+    versions = {f['id']: get_file_version(f) for f in all_files}
+    user_db_id, renewal_id, realtime_id, rules_id = None, None, None, None
+    realtime_meta = None
+    monthly_files = []
+    for f in all_files:
+        name = f['name']
+        if name.endswith(SIDECAR_SUFFIX): continue
+        if name == "user_db.json": user_db_id = f['id']
+        elif name == "realtime_usage.json": 
+            realtime_id = f['id']
+            realtime_meta = f
+        elif name == ACCRUAL_RULES_FILE: rules_id = f['id']
+        elif is_renewal_name(name): renewal_id = f['id']
+        elif ".xlsx" in name: monthly_files.append(f)
+    monthly_files.sort(key=lambda x: get_file_sort_key(x['name']), reverse=True)
+    return (user_db_id, renewal_id, realtime_id, monthly_files, realtime_meta, versions, rules_id)
+
+# 저장소 오류는 캐시하지 않도록 예외로 올리고(on_error 가 빈 값으로 바꿔 반환), 캐시 함수끼리는 .strict 로 호출해
+# 한 단계에서 실패한 빈 값이 위 단계 캐시에 해당 버전의 결과로 굳지 않게 함
+def empty_frame(columns=None):
+    import pandas as pd
+    return pd.DataFrame(columns=columns)
+
+def empty_matrix():
+    from leave_parser import EMPTY_MATRIX
+    return EMPTY_MATRIX
+
+def empty_index():
+    return MappingProxyType({})
+
+@tracked(st.cache_data(max_entries=20), on_error=dict)
+def load_json_file(file_id, version=""):
     if not file_id: return {}
+    key = snapshot_key("json", file_id)
+    cached = read_snapshot(key, version, "json")
+    if cached is not None: return cached
+    with span("storage.read", backend=STORAGE_BACKEND, file=file_id): raw = get_storage().read_bytes(file_id)
+    try: data = json.loads(raw)
+    except ValueError: return {}
+    write_snapshot(key, version, data, "json")
+    return data
+
+def update_cached_user_db(file_id, old_version, data, meta):
+    # 비밀번호 변경 시 전체 캐시를 비우지 않고 사용자 DB 항목만 갱신 (write-through)
+    # 새 버전 스냅샷을 먼저 써 두고 확정 목록의 버전만 바꾸면, 다음 요청은 다운로드 없이 새 내용을 받음
+    new_version = get_file_version(meta)
+    write_snapshot(snapshot_key("json", file_id), new_version, data, "json")
+    load_json_file.clear(file_id, old_version)
+    patch_catalog_version(file_id, meta)
+
+# 사용자 DB 쓰기: 세션이 들고 있는 사본 전체를 덮어쓰지 않고, 바뀐 사용자 항목만 패치로 받아
+# 서버 최신본에 적용 → 동시에 들어온 패치는 한 번의 업로드로 합침 (프로세스 공용 writer)
+USER_DB_WRITE_RETRIES = 3
+
+@st.cache_resource
+def get_user_db_writer():
+    return {'lock': threading.Lock(), 'pending': [], 'flushing': False}
+
+def patch_user_db(file_id, uid, changes, timeout=30):
+    # 성공 시 (적용된 전체 DB, 새 메타데이터), 실패 시 None
+    writer = get_user_db_writer()
+    job = {'uid': uid, 'changes': dict(changes), 'done': threading.Event(), 'result': None}
+    with writer['lock']:
+        writer['pending'].append(job)
+        leader = not writer['flushing']
+        writer['flushing'] = True
+    if leader:
+        # 먼저 도착한 요청이 대기 중인 패치를 모두 모아 업로드 (업로드 중 도착분은 다음 차례에 합쳐짐)
+        while True:
+            with writer['lock']:
+                batch, writer['pending'] = writer['pending'], []
+                if not batch:
+                    writer['flushing'] = False; break
+            try: result = _flush_user_db(file_id, batch)
+            except: result = None
+            for j in batch:
+                j['result'] = result; j['done'].set()
+    job['done'].wait(timeout)
+    return job['result']
+
+def _flush_user_db(file_id, batch):
+    # 버전 충돌만 최신본으로 다시 시도, 저장소 오류는 그대로 올려 실패로 처리 (재시도는 저장소 보호 계층이 담당)
+    storage = get_storage()
+    for attempt in range(USER_DB_WRITE_RETRIES):
+        if attempt: time.sleep(0.2 * attempt)
+        with span("storage.metadata", backend=STORAGE_BACKEND, file=file_id): base = storage.get_metadata(file_id)
+        data = load_json_file.strict(file_id, get_file_version(base))
+        if not data: return None  # 최신본이 비었거나 깨졌으면 빈 DB 로 덮어쓰지 않음
+        for job in batch: data[job['uid']] = {**data.get(job['uid'], {}), **job['changes']}
+        body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+        with span("storage.write", backend=STORAGE_BACKEND, file=file_id, attempt=attempt):
+            meta = storage.write_bytes(file_id, body, 'application/json', expected_version=base.get('version'))
+        if not meta: continue  # 그 사이 다른 쪽에서 수정됨 → 최신본으로 다시
+        update_cached_user_db(file_id, get_file_version(base), data, meta)
+        return data, meta
+    return None
+
+def download_file(file_id):
+    with span("storage.read", backend=STORAGE_BACKEND, file=file_id): return io.BytesIO(get_storage().read_bytes(file_id))
+
+# 사이드카(leave_parser.build_sidecar): 엑셀 원본 옆의 "{원본 이름}.parquet" 을 원본 대신 내려받아 파싱 없이 복원
+# 목록을 갱신할 때마다 원본 → 사이드카 대응을 다시 잡고, 사이드카가 없거나 낡은 원본은 백그라운드에서 변환해 올림
+# (변환은 이미 캐시에 있는 파싱 결과를 저장하므로 원본을 따로 한 번 더 받지 않음)
+# PTO_SIDECARS=1 일 때만 자동 변환 (공유 폴더에 파일을 새로 만들므로 기본은 끔), 이미 있는 사이드카는 설정과 관계없이 읽음
+# 사이드카가 원본 엑셀보다 크면 쓰지 않음 (인원이 적으면 Parquet 메타데이터 때문에 엑셀보다 커짐)
+SIDECARS_ENABLED = str(get_config("PTO_SIDECARS", "")).lower() in ("1", "true", "on")
+
+@st.cache_resource
+def get_sidecar_state():
+    # sources: 원본 id -> {'meta': 원본 메타, 'sidecar': 사이드카 메타 또는 None}
+    # current: 원본 id -> 사이드카에 들어 있는 것으로 확인된 원본 버전 (읽어 보니 달랐으면 False)
+    # larger: 원본 id -> 사이드카가 원본보다 커서 쓰지 않은 원본 버전 (같은 버전은 다시 변환하지 않음)
+    return {'lock': threading.Lock(), 'sources': {}, 'current': {}, 'larger': {}, 'converting': False}
+
+def index_sidecars(all_files):
+    from leave_parser import SIDECAR_SUFFIX
+    by_name = {f['name']: f for f in all_files}
+    sources = {f['id']: {'meta': f, 'sidecar': by_name.get(f['name'] + SIDECAR_SUFFIX)}
+               for f in all_files if ".xlsx" in f['name'] and not f['name'].endswith(SIDECAR_SUFFIX)}
+    state = get_sidecar_state()
+    with state['lock']: state['sources'] = sources
+
+def load_sidecar(file_id, version, is_renewal=False):
+    # 원본 버전과 같은 사이드카가 있으면 파싱 결과(월별 UsageMatrix, 갱신 DataFrame), 없거나 다르면 None
+    from leave_parser import read_sidecar
+    state = get_sidecar_state()
+    entry = state['sources'].get(file_id)
+    sidecar = entry['sidecar'] if entry else None
+    known = state['current'].get(file_id)
+    if not sidecar or not version or (known is not None and known != version): return None
+    with span("storage.read", backend=STORAGE_BACKEND, file=sidecar['id'], sidecar=True): data = get_storage().read_bytes(sidecar['id'])
+    result = read_sidecar(data, version, is_renewal)
+    state['current'][file_id] = version if result is not None else False
+    return result
+
+def sidecar_outdated(state, file_id, entry):
+    version = get_file_version(entry['meta'])
+    if state['larger'].get(file_id) == version: return False
+    known = state['current'].get(file_id)
+    if known is not None: return known != version
+    # 아직 읽어 보지 않은 사이드카는 원본보다 나중에 쓰였으면 최신으로 간주 (읽을 때 버전을 다시 확인)
+    sidecar = entry['sidecar']
+    return not sidecar or sidecar.get('modifiedTime', '') < entry['meta'].get('modifiedTime', '')
+
+def start_sidecar_conversion():
+    state = get_sidecar_state()
+    with state['lock']:
+        if state['converting']: return
+        pending = [(file_id, entry) for file_id, entry in state['sources'].items() if sidecar_outdated(state, file_id, entry)]
+        if not pending: return
+        state['converting'] = True
+    threading.Thread(target=convert_sidecars, args=(pending,), name="pto-sidecar", daemon=True).start()
+
+def convert_sidecars(pending):
+    from leave_parser import SIDECAR_MIMETYPE, SIDECAR_SUFFIX, is_renewal_name, matrix_to_frame, sidecar_bytes
+    state = get_sidecar_state()
+    storage = get_storage()
+    try:
+        for file_id, entry in pending:
+            meta = entry['meta']
+            version, renewal = get_file_version(meta), is_renewal_name(meta['name'])
+            try:
+                with span("sidecar.convert", file=file_id):
+                    if renewal: df = fetch_excel.strict(file_id, version, is_renewal=True)
+                    else:
+                        matrix = get_usage_matrix.strict(file_id, version)
+                        df = matrix_to_frame(matrix) if matrix.names else None
+                    if df is None or df.empty or state['current'].get(file_id) == version: continue
+                    body = sidecar_bytes(df, version, renewal)
+                    if len(body) >= int(meta.get('size') or 0):
+                        with state['lock']: state['larger'][file_id] = version
+                        continue
+                    if entry['sidecar']: written = storage.write_bytes(entry['sidecar']['id'], body, SIDECAR_MIMETYPE)
+                    else: written = storage.create_bytes(meta['name'] + SIDECAR_SUFFIX, body, SIDECAR_MIMETYPE)
+                with state['lock']:
+                    entry['sidecar'] = written
+                    state['current'][file_id] = version
+            except StorageError: break  # 저장소가 불안정하면 다음 목록 갱신 때 다시
+    finally: state['converting'] = False
+
+# 월별 파일은 직원 × 일자 코드 행렬(leave_parser.UsageMatrix)로 한 번만 파싱해 프로세스 공용으로 보관
+# 표시용 표(사용내역 문자열·개수)는 파일 이름의 월 접두어를 붙여 행렬에서 파생 → 같은 파일을 이름 유무로 두 번 받지 않음
+@tracked(st.cache_resource(max_entries=100, show_spinner=False), on_error=empty_matrix)
+def get_usage_matrix(file_id, version=""):
+    from leave_parser import parse_monthly_matrix, matrix_from_frame, matrix_to_frame
+    key = snapshot_key("matrix", file_id)
+    cached = read_snapshot(key, version, "parquet")
+    if cached is not None:
+        matrix = matrix_from_frame(cached)
+        if matrix is not None: return matrix
+    matrix = load_sidecar(file_id, version)
+    if matrix is None:
+        content = download_file(file_id)
+        with span("parse", file=file_id, renewal=False): matrix = parse_monthly_matrix(content)
+    if matrix.names: write_snapshot(key, version, matrix_to_frame(matrix), "parquet")
+    return matrix
+
+@tracked(st.cache_data(max_entries=100), on_error=empty_frame)
+def fetch_excel(file_id, version="", filename=None, is_renewal=False):
+    from leave_parser import get_month_prefix, parse_excel_content, usage_frame
+    if not is_renewal: return usage_frame(get_usage_matrix.strict(file_id, version), get_month_prefix(filename))
+    key = snapshot_key("renewal", file_id)
+    cached = read_snapshot(key, version, "parquet")
+    if cached is not None: return cached
+    df = load_sidecar(file_id, version, is_renewal=True)
+    if df is None:
+        content = download_file(file_id)
+        with span("parse", file=file_id, renewal=True): df = parse_excel_content(content, is_renewal=True)
+    if not df.empty: write_snapshot(key, version, df, "parquet")
+    return df
+
+# ==============================================================================
+# 2-2. 직원별 인덱스 (프로세스 공용, 읽기 전용)
+# ==============================================================================
+# 파싱 결과를 이름 -> 레코드 딕셔너리로 한 번만 만들어 모든 세션이 공유 (매 rerun 마다 DataFrame 필터링 방지)
+LeaveRecord = namedtuple('LeaveRecord', ['remain', 'used', 'usage'])
+RenewalRecord = namedtuple('RenewalRecord', ['date', 'date_str', 'count'])
+
+def build_leave_index(df):
+    index = {}
+    if df.empty: return MappingProxyType(index)
+    for name, usage, used, remain in zip(df['이름'], df['사용내역'], df['사용개수'], df['잔여']):
+        if name not in index: index[name] = LeaveRecord(float(remain), float(used), usage)
+    return MappingProxyType(index)
+
+def build_renewal_index(df):
+    index = {}
+    if df.empty: return MappingProxyType(index)
+    for name, date_str, count in zip(df['이름'], df['갱신일'], df['갱신개수']):
+        if name in index: continue
+        try: renew_date = datetime.date.fromisoformat(date_str)
+        except: renew_date = None
+        index[name] = RenewalRecord(renew_date, date_str, float(count))
+    return MappingProxyType(index)
+
+@tracked(st.cache_resource(max_entries=100, show_spinner=False), on_error=empty_index)
+def get_leave_index(file_id, version="", filename=None):
+    return build_leave_index(fetch_excel.strict(file_id, version, filename=filename))
+
+@tracked(st.cache_resource(max_entries=10, show_spinner=False), on_error=empty_index)
+def get_renewal_index(file_id, version=""):
+    if not file_id: return MappingProxyType({})
+    return build_renewal_index(fetch_excel.strict(file_id, version, is_renewal=True))
+
+# 실시간 사용 내역(realtime_usage.json): 드라이브 버전마다 한 번만 파싱해 세션 공용으로 사용
+# valid_month 는 파일이 마지막으로 갱신된 KST 연·월 (이번 달에 갱신된 데이터만 잔여 계산에 반영)
+RealtimeRecord = namedtuple('RealtimeRecord', ['used', 'days', 'details', 'details_formatted'])
+RealtimeModel = namedtuple('RealtimeModel', ['valid_month', 'last_updated', 'users'])
+
+def build_realtime_model(data, modified_time):
+    valid_month = None
     try:
-        request = service.files().get_media(fileId=file_id)
-        return json.load(io.BytesIO(request.execute()))
-    except: return {}
+        mod_time_utc = datetime.datetime.fromisoformat(modified_time.replace('Z', '+00:00'))
+        mod_time_kst = mod_time_utc + datetime.timedelta(hours=9)
+        valid_month = (mod_time_kst.year, mod_time_kst.month)
+    except: pass
+    users = {}
+    for uid, rt_data in (data or {}).items():
+        if not isinstance(rt_data, dict): continue
+        try:
+            details = str(rt_data.get('details', ''))
+            days = tuple(int(d) for d in re.findall(r'(\d+)일', details))
+            formatted = re.sub(r'(\d+)일', f'{valid_month[1]}월 \\1일', details) if valid_month else details
+            users[uid] = RealtimeRecord(float(rt_data.get('used', 0.0)), days, details, formatted)
+        except: continue
+    return RealtimeModel(valid_month, (data or {}).get('__last_updated__', ''), MappingProxyType(users))
+
+@tracked(st.cache_resource(max_entries=4, show_spinner=False), on_error=lambda: build_realtime_model({}, ""))
+def get_realtime_model(file_id, version="", modified_time=""):
+    return build_realtime_model(load_json_file.strict(file_id, version) if file_id else {}, modified_time)
+
+# ==============================================================================
+# 2-3. 월별 파일 일괄 로드 (병렬) & 캐시 예열 (백그라운드)
+# ==============================================================================
+PREFETCH_MONTHS = int(get_config("PTO_PREFETCH_MONTHS", "12"))  # 0 이면 전체 보관분
+PREFETCH_WORKERS = 4
+
+def get_archive_key(monthly_files):
+    return tuple((f['id'], get_file_version(f), f['name']) for f in monthly_files)
+
+def prefetch_monthly_files(archive_key, limit=PREFETCH_MONTHS, max_workers=PREFETCH_WORKERS):
+    # archive_key: ((id, version, name), ...) 최신순
+    # 월별 탭과 같은 캐시(get_leave_index → fetch_excel)를 채우므로 이후 월 선택은 드라이브를 기다리지 않음
+    from concurrent.futures import ThreadPoolExecutor
+    targets = archive_key[:limit] if limit else archive_key
+    if not targets: return
+
+    def load(target):
+        file_id, version, name = target
+        try: get_leave_index(file_id, version, filename=name)
+        except: pass
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(targets)), thread_name_prefix="pto-prefetch") as pool:
+        list(pool.map(load, targets))
 
-def save_user_db(file_id, data):
-    service = get_drive_service()
+@st.cache_resource(max_entries=4, show_spinner=False)
+def start_archive_prefetch(archive_key):
+    # 목록 상태(파일 id·버전)가 바뀔 때마다 한 번씩만 백그라운드 로드
+    thread = threading.Thread(target=prefetch_monthly_files, args=(archive_key,), name="pto-archive", daemon=True)
+    thread.start()
+    return thread
+
+# 예열은 스크립트가 실행될 때마다 요청하되, 진행 중이거나 마지막 예열 후 WARMUP_INTERVAL 이 지나지 않았으면 건너뜀
+# keep-warm 프로브(tests/keep_warm.py)가 부르는 /_stcore/script-health-check 도 스크립트를 한 번 실행하므로 같은 경로로 예열되고,
+# 단계별 소요 시간은 static/warmup.json (app/static/warmup.json) 에 기록해 프로브가 읽어 감
+WARMUP_INTERVAL = 60  # 초 (목록 캐시 TTL 과 동일)
+WARMUP_STATUS_FILE = "warmup.json"
+
+@st.cache_resource(show_spinner=False)
+def get_warmup_state():
+    return {'lock': threading.Lock(), 'running': False, 'started': 0.0, 'last': None}
+
+def warm_caches(state):
+    # 목록 → 사용자 DB/실시간 JSON → 갱신 파일 → 최신 월 파일(잔여 탭, 월별 탭 기본 선택) 순으로 미리 파싱
+    started = time.time()
+    steps, error = {}, None
+    def step(name, fn, *args, **kwargs):
+        t = time.perf_counter()
+        try: return fn(*args, **kwargs)
+        finally: steps[name] = round((time.perf_counter() - t) * 1000, 1)
+    monthly_count = 0
     try:
-        json_str = json.dumps(data, indent=2, ensure_ascii=False)
-        media = MediaIoBaseUpload(io.BytesIO(json_str.encode('utf-8')), mimetype='application/json')
-        service.files().update(fileId=file_id, media_body=media).execute()
-        return True
-    except: return False
-
-@st.cache_data(ttl=300)
-def fetch_excel(file_id, filename=None, is_renewal=False):
-    service = get_drive_service()
+        with span("warmup"):
+            user_db_id, renewal_id, realtime_id, monthly_files, realtime_meta, file_versions, rules_id = step("catalog", lambda: refresh_catalog() or EMPTY_CATALOG)
+            monthly_count = len(monthly_files)
+            if user_db_id: step("user_db", load_json_file, user_db_id, file_versions.get(user_db_id, ""))
+            if realtime_id: step("realtime", get_realtime_model, realtime_id, get_file_version(realtime_meta), realtime_meta.get('modifiedTime', ''))
+            if renewal_id: step("renewal", get_renewal_index, renewal_id, file_versions.get(renewal_id, ""))
+            step("accrual", get_accrual_schedule, rules_id, file_versions.get(rules_id, ""), renewal_id, file_versions.get(renewal_id, ""))
+            if monthly_files:
+                latest = monthly_files[0]
+                step("latest_month", get_leave_index, latest['id'], get_file_version(latest))
+                step("latest_month_named", get_leave_index, latest['id'], get_file_version(latest), filename=latest['name'])
+                start_archive_prefetch(get_archive_key(monthly_files))
+    except Exception as e: error = type(e).__name__
+    finished = time.time()
+    status = {'ok': error is None and monthly_count > 0, 'error': error, 'started': round(started, 3), 'finished': round(finished, 3),
+              'total_ms': round((finished - started) * 1000, 1), 'steps': steps, 'monthly_files': monthly_count,
+              'storage': STORAGE_BACKEND, 'pid': os.getpid()}
+    state['last'] = status
+    state['running'] = False
     try:
-        request = service.files().get_media(fileId=file_id)
-        content = io.BytesIO(request.execute())
-        if is_renewal:
-            df_meta = pd.read_excel(content, header=None, nrows=3)
-            try: target_year = int(df_meta.iloc[1, 0])
-            except: target_year = datetime.datetime.now().year
-            content.seek(0)
-            df = pd.read_excel(content, header=3)
-            df.columns = df.columns.astype(str).str.replace(" ", "").str.replace("\n", "")
-            parsed = []
-            for i, row in df.iterrows():
-                name = str(row.iloc[0]).replace(" ", "").strip()
-                if name and name != "nan" and name != "이름":
-                    try:
-                        month = int(row['월']); day = int(row['일'])
-                        renewal_date = f"{target_year}-{month:02d}-{day:02d}"
-                        count = row.get('올해발생연차개수', 0)
-                        parsed.append({'이름': name, '갱신일': renewal_date, '갱신개수': float(count)})
-                    except: continue
-            return pd.DataFrame(parsed)
-        else:
-            current_month_str = ""
-            if filename:
-                match = re.search(r'_(\d+)월', filename)
-                if match: current_month_str = match.group(1)
-
-            df_raw = pd.read_excel(content, header=None)
-            name_row_idx = -1
-            for i, row in df_raw.iterrows():
-                if any("성명" in str(x).replace(" ", "") for x in row.astype(str).values):
-                    name_row_idx = i; break
-            if name_row_idx == -1: return pd.DataFrame()
-            remain_col_idx = -1
-            for r_idx in [name_row_idx, name_row_idx + 1]:
-                if r_idx < len(df_raw):
-                    for c_idx, val in enumerate(df_raw.iloc[r_idx]):
-                        if "연차잔여일" in str(val).replace(" ", ""):
-                            remain_col_idx = c_idx; break
-                if remain_col_idx != -1: break
-            content.seek(0)
-            df = pd.read_excel(content, header=name_row_idx)
-            df.columns = df.columns.astype(str).str.replace(" ", "").str.replace("\n", "")
-            date_cols = [c for c in df.columns if str(c).isdigit() and 1 <= int(str(c)) <= 31]
-            parsed = []
-            for i in range(len(df)):
-                row = df.iloc[i]
-                name = str(row.get('성명', '')).replace(" ", "").strip()
-                if name and name != "nan":
-                    usage, count = [], 0.0
-                    for d in date_cols:
-                        val = str(row[d])
-                        date_prefix = f"{current_month_str}월 " if current_month_str else ""
-                        if "연차" in val or "휴가" in val: 
-                            usage.append(f"{date_prefix}{d}일({val.strip()})")
-                            count += 1.0
-                        elif "반차" in val: 
-                            usage.append(f"{date_prefix}{d}일(반차)")
-                            count += 0.5
-                    remain = 0.0
-                    if remain_col_idx != -1 and i + 1 < len(df):
-                        try: remain = float(df.iloc[i+1, remain_col_idx])
-                        except: remain = 0.0
-                    parsed.append({'이름': name, '사용내역': ", ".join(usage) if usage else "-", '사용개수': count, '잔여': remain})
-            return pd.DataFrame(parsed)
-    except: return pd.DataFrame()
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        write_atomic(os.path.join(STATIC_DIR, WARMUP_STATUS_FILE), lambda p: _dump_json(p, status))
+    except: pass
+
+def start_warmup():
+    state = get_warmup_state()
+    now = time.time()
+    with state['lock']:
+        if state['running'] or now - state['started'] < WARMUP_INTERVAL: return
+        state['running'], state['started'] = True, now
+    threading.Thread(target=warm_caches, args=(state,), name="pto-warmup", daemon=True).start()
+
+# ==============================================================================
+# 2-4. 직원별 월간 합산 타임라인 (전체 월별 파일, 바뀐 달만 다시 반영)
+# ==============================================================================
+# 월마다 사용 칸만 뽑은 블록(leave_parser.matrix_events)을 (연, 월) 별로 보관하고, 목록이 바뀌면
+# 새로 생기거나 버전이 바뀐 달만 다시 읽어 합침 → 연간 누적·기간 조회는 엑셀을 다시 읽지 않고 이 인덱스로 응답
+# 타임라인: 직원별로 (날짜순) 연속 구간 → offsets[e]:offsets[e+1] 가 index[이름] = e 인 직원의 기록
+LeaveTimeline = namedtuple('LeaveTimeline', ['index', 'offsets', 'dates', 'labels', 'weights', 'months'])
+
+@st.cache_resource(show_spinner=False)
+def get_timeline_state():
+    return {'lock': threading.Lock(), 'key': None, 'blocks': {}, 'timeline': None}
+
+def merge_timeline(blocks):
+    import numpy as np
+    months = tuple(sorted(blocks))
+    parts = [blocks[ym][1] for ym in months]
+    if not parts or not sum(len(p[0]) for p in parts):
+        return LeaveTimeline(MappingProxyType({}), np.zeros(1, dtype=np.int64), np.array([], dtype='datetime64[D]'),
+                             np.array([], dtype=object), np.zeros(0), months)
+    names, dates, labels, weights = (np.concatenate(col) for col in zip(*parts))
+    emp_names, emp = np.unique(names.astype(str), return_inverse=True)
+    order = np.lexsort((dates, emp))
+    offsets = np.searchsorted(emp[order], np.arange(len(emp_names) + 1))
+    index = {name: e for e, name in enumerate(emp_names.tolist())}
+    return LeaveTimeline(MappingProxyType(index), offsets, dates[order], labels[order], weights[order], months)
+
+def get_timeline(archive_key):
+    # archive_key: get_archive_key(monthly_files) — 같은 (연, 월) 파일이 여럿이면 목록 순서상 앞의 것
+    from concurrent.futures import ThreadPoolExecutor
+    from leave_parser import matrix_events
+    state = get_timeline_state()
+    with state['lock']:
+        if state['key'] == archive_key: return state['timeline']
+        with span("timeline.update"):
+            targets = {}
+            for file_id, version, name in archive_key:
+                ym = get_file_sort_key(name)
+                if ym != (0, 0) and ym not in targets: targets[ym] = (file_id, version)
+            blocks = {ym: state['blocks'][ym] for ym, source in targets.items() if ym in state['blocks'] and state['blocks'][ym][0] == source}
+            changed = [ym for ym in targets if ym not in blocks]
+            def load(ym):
+                file_id, version = targets[ym]
+                try: return ym, (targets[ym], matrix_events(get_usage_matrix.strict(file_id, version), *ym))
+                except StorageError: return ym, None
+            failed = False
+            if changed:
+                with ThreadPoolExecutor(max_workers=min(PREFETCH_WORKERS, len(changed)), thread_name_prefix="pto-timeline") as pool:
+                    for ym, block in pool.map(load, changed):
+                        if block is None: failed = True
+                        else: blocks[ym] = block
+            # 못 읽은 달은 빼고 합산하되 키를 남기지 않아 다음 호출에서 그 달만 다시 시도
+            state['blocks'], state['key'] = blocks, (None if failed else archive_key)
+            state['timeline'] = merge_timeline(blocks)
+        return state['timeline']
+
+def timeline_range(timeline, name, start=None, end=None):
+    # 직원 한 명의 [start, end] (날짜 포함) 기록 구간 → (날짜, 라벨, 개수) 배열
+    import numpy as np
+    e = timeline.index.get(name)
+    if e is None: return timeline.dates[:0], timeline.labels[:0], timeline.weights[:0]
+    lo, hi = int(timeline.offsets[e]), int(timeline.offsets[e + 1])
+    dates = timeline.dates[lo:hi]
+    if end is not None: hi = lo + int(dates.searchsorted(np.datetime64(end, 'D'), 'right'))
+    if start is not None: lo += int(dates.searchsorted(np.datetime64(start, 'D'), 'left'))
+    return timeline.dates[lo:hi], timeline.labels[lo:hi], timeline.weights[lo:hi]
+
+def timeline_monthly_totals(timeline, name, year):
+    # 1~12월 사용 개수 (해당 연도, 파일이 있는 달만 의미 있음)
+    import numpy as np
+    dates, _, weights = timeline_range(timeline, name, datetime.date(year, 1, 1), datetime.date(year, 12, 31))
+    months = dates.astype('datetime64[M]').astype(int) % 12
+    return np.bincount(months, weights=weights, minlength=12)
 
 # ==============================================================================
 # 3. 유틸리티 함수 & 특수 규칙 계산기
@@ -262,70 +977,150 @@ def get_kst_now():
 def get_kst_today():
     return get_kst_now().date()
 
-def get_smart_renewal_bonus(uid, base_filename):
-    if renewal_df.empty or not base_filename: return 0.0
-    me = renewal_df[renewal_df['이름'] == uid]
-    if not me.empty:
+def get_file_end_date(filename):
+    # 파일명 YYYY_M 의 말일 (기준 파일이 반영한 마지막 날짜)
+    match = re.search(r'(\d{4})_(\d+)', filename or "")
+    try:
+        if match:
+            f_year, f_month = int(match.group(1)), int(match.group(2))
+            return datetime.date(f_year, f_month, calendar.monthrange(f_year, f_month)[1])
+    except: pass
+    return datetime.date(2000, 1, 1)
+
+def add_months(d, months):
+    y, m = divmod(d.month - 1 + months, 12)
+    year, month = d.year + y, m + 1
+    return datetime.date(year, month, min(d.day, calendar.monthrange(year, month)[1]))
+
+# ==============================================================================
+# 3-1. 연차 발생 규칙 엔진
+# ==============================================================================
+# 규칙표(드라이브의 accrual_rules.json, 예: [{"name": "홍길동", "hire_date": "2026-03-02", "anniversary_count": 15}])
+#  - first_year : 입사 후 1년 미만 매월 입사일자에 1개 (11회) + 1년 근속일에 anniversary_count 개
+#  - renewal    : 갱신 파일의 갱신일에 갱신개수 (갱신 파일에서 자동 생성)
+# 발생일이 기준 월 파일의 말일 이후이고 오늘 이전이면 잔여에 더함 (파일에 이미 반영된 발생분은 제외)
+# 규칙표가 없으면 first_year 규칙 없음 (직원 정보는 코드에 두지 않음)
+DEFAULT_ACCRUAL_RULES = []
+
+AccrualRule = namedtuple('AccrualRule', ['name', 'hire_date', 'monthly_dates', 'anniversary', 'anniversary_count'])
+AccrualBonus = namedtuple('AccrualBonus', ['renewal', 'special'])
+NO_ACCRUAL = AccrualBonus(0.0, 0.0)
+
+def build_accrual_rules(rows):
+    rules = {}
+    for row in rows or []:
         try:
-            renew_date = pd.to_datetime(me.iloc[0]['갱신일']).date()
-            today_kst = get_kst_today()
-            match = re.search(r'(\d{4})_(\d+)', base_filename)
-            if match:
-                f_year, f_month = int(match.group(1)), int(match.group(2))
-                last_day = calendar.monthrange(f_year, f_month)[1]
-                file_end_date = datetime.date(f_year, f_month, last_day)
-            else: file_end_date = datetime.date(2000, 1, 1)
-
-            if today_kst >= renew_date and renew_date > file_end_date:
-                return float(me.iloc[0]['갱신개수'])
-        except: pass
-    return 0.0
-
-def get_kim_special_calc(uid, mode='total', base_file_date=None):
-    if uid != "김동준": return 0.0
-    bonus = 0.0
-    monthly_dates = [
-        datetime.date(2025, 8, 1), datetime.date(2025, 9, 1), datetime.date(2025, 10, 1),
-        datetime.date(2025, 11, 1), datetime.date(2025, 12, 1), datetime.date(2026, 1, 1),
-        datetime.date(2026, 2, 1), datetime.date(2026, 3, 1), datetime.date(2026, 4, 1),
-        datetime.date(2026, 5, 1), datetime.date(2026, 6, 1)
-    ]
-    today = get_kst_today()
-    for d in monthly_dates:
-        if today >= d:
-            if mode == 'total': bonus += 1.0
-            elif mode == 'incremental' and base_file_date and d > base_file_date: bonus += 1.0
-    if today >= datetime.date(2026, 7, 1): bonus += 15.0
-    return bonus
+            if row.get('rule', 'first_year') != 'first_year': continue
+            name = str(row['name']).replace(" ", "")
+            hire = datetime.date.fromisoformat(str(row['hire_date']))
+            monthly_dates = tuple(add_months(hire, k) for k in range(1, 12))
+            rules[name] = AccrualRule(name, hire, monthly_dates, add_months(hire, 12), float(row.get('anniversary_count', 15)))
+        except: continue
+    return MappingProxyType(rules)
+
+@tracked(st.cache_resource(max_entries=4, show_spinner=False), on_error=lambda: build_accrual_rules([]))
+def get_accrual_rules(rules_id, version=""):
+    if not rules_id: return build_accrual_rules(DEFAULT_ACCRUAL_RULES)
+    data = load_json_file.strict(rules_id, version)
+    return build_accrual_rules(data.get('rules', []) if isinstance(data, dict) else data)
+
+def build_accrual_schedule(rules, renewal_index):
+    # 직원별 발생 일정을 한 번에 펼친 표: 이름 / 발생일 / 개수 / 구분(monthly·anniversary·renewal)
+    import pandas as pd
+    names, dates, counts, kinds = [], [], [], []
+    for r in rules.values():
+        for d in r.monthly_dates:
+            names.append(r.name); dates.append(d); counts.append(1.0); kinds.append('monthly')
+        names.append(r.name); dates.append(r.anniversary); counts.append(r.anniversary_count); kinds.append('anniversary')
+    for name, rec in renewal_index.items():
+        if rec.date is not None:
+            names.append(name); dates.append(rec.date); counts.append(rec.count); kinds.append('renewal')
+    return pd.DataFrame({'이름': names, '발생일': pd.to_datetime(pd.Series(dates, dtype=object)), '개수': counts, '구분': kinds})
+
+@tracked(st.cache_resource(max_entries=4, show_spinner=False), on_error=empty_frame)
+def get_accrual_schedule(rules_id, rules_version, renewal_id, renewal_version):
+    return build_accrual_schedule(get_accrual_rules.strict(rules_id, rules_version), get_renewal_index.strict(renewal_id, renewal_version))
+
+def evaluate_accruals(schedule, as_of, file_end_date):
+    # 전 직원의 발생분을 한 번의 벡터 연산으로 계산 → {이름: AccrualBonus}
+    import pandas as pd
+    if schedule.empty: return MappingProxyType({})
+    as_of_ts, file_end_ts = pd.Timestamp(as_of), pd.Timestamp(file_end_date)
+    credited = ((schedule['발생일'] <= as_of_ts) & (schedule['발생일'] > file_end_ts)).to_numpy()
+    kind = schedule['구분'].to_numpy()
+    counts = schedule['개수'].fillna(0.0).to_numpy()
+    table = pd.DataFrame({
+        '이름': schedule['이름'].to_numpy(),
+        'renewal': counts * (credited & (kind == 'renewal')),
+        'special': counts * (credited & (kind != 'renewal')),
+    }).groupby('이름', sort=False).sum()
+    return MappingProxyType({name: AccrualBonus(*row) for name, row in zip(table.index, table.itertuples(index=False, name=None))})
+
+@tracked(st.cache_resource(max_entries=16, show_spinner=False), on_error=empty_index)
+def get_accrual_bonuses(rules_id, rules_version, renewal_id, renewal_version, as_of, file_end_date):
+    # (규칙·갱신 파일 버전, 날짜, 기준 파일 말일) 별로 하루 한 번만 계산되고 이후는 딕셔너리 조회
+    return evaluate_accruals(get_accrual_schedule.strict(rules_id, rules_version, renewal_id, renewal_version), as_of, file_end_date)
+
+def get_file_month(filename):
+    match = re.search(r'(\d+)월', filename or "")
+    return int(match.group(1)) if match else None
+
+def realtime_applies(rt_model, file_month, today):
+    # 기준 파일 이후 달이고, 실시간 파일이 이번 달에 갱신된 경우에만 실시간 사용분을 차감
+    return file_month is not None and today.month > file_month and rt_model.valid_month == (today.year, today.month)
+
+# ==============================================================================
+# 3-2. 관리자 전체 현황 (전 직원 잔여를 한 번에 계산)
+# ==============================================================================
+ROSTER_COLUMNS = ['이름', '기준잔여', '갱신', '1년미만발생', '실시간사용', '예상잔여']
+
+def build_roster(leave_df, accruals, rt_model, file_month, today):
+    import pandas as pd
+    if leave_df.empty: return pd.DataFrame(columns=ROSTER_COLUMNS)
+    base = leave_df.drop_duplicates('이름')[['이름', '잔여']].rename(columns={'잔여': '기준잔여'}).set_index('이름')
+    acc = pd.DataFrame(list(accruals.values()), index=list(accruals.keys()), columns=list(NO_ACCRUAL._fields))
+    used = pd.Series({uid: rec.used for uid, rec in rt_model.users.items()}, dtype=float) if realtime_applies(rt_model, file_month, today) else pd.Series(dtype=float)
+    roster = base.join(acc.rename(columns={'renewal': '갱신', 'special': '1년미만발생'}), how='left')
+    roster['실시간사용'] = used.reindex(roster.index)
+    roster = roster.fillna({'갱신': 0.0, '1년미만발생': 0.0, '실시간사용': 0.0})
+    roster['예상잔여'] = roster['기준잔여'] + roster['갱신'] + roster['1년미만발생'] - roster['실시간사용']
+    return roster.reset_index().rename(columns={'index': '이름'})[ROSTER_COLUMNS]
+
+@tracked(st.cache_data(max_entries=8, show_spinner=False), on_error=lambda: empty_frame(ROSTER_COLUMNS))
+def get_roster(file_id, version, latest_fname, rules_id, rules_version, renewal_id, renewal_version, realtime_id, realtime_version, realtime_modified, today):
+    accruals = get_accrual_bonuses.strict(rules_id, rules_version, renewal_id, renewal_version, today, get_file_end_date(latest_fname))
+    rt_model = get_realtime_model.strict(realtime_id, realtime_version, realtime_modified)
+    # get_leave_index 와 같은 인자 형태로 호출해야 같은 캐시 항목을 공유함 (위치/키워드 인자가 다르면 캐시 키도 다름)
+    return build_roster(fetch_excel.strict(file_id, version, filename=None), accruals, rt_model, get_file_month(latest_fname), today)
+
+def roster_to_xlsx(df):
+    # openpyxl write-only 모드로 행 단위 기록 (큰 표도 메모리에 셀 객체를 쌓지 않음)
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("전체현황")
+    ws.append(list(df.columns))
+    for row in df.itertuples(index=False, name=None):
+        ws.append([None if isinstance(v, float) and math.isnan(v) else v for v in row])
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
 
 def format_leave_num(val):
-    if pd.isna(val) or math.isnan(val): return "∞"
+    if val is None or math.isnan(val): return "∞"
     if val % 1 == 0: return f"{int(val)}"
     return f"{val}"
 
-@st.cache_data
-def get_image_base64(image_path):
-    try:
-        with open(image_path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode()
-    except:
-        return None
-
 # ==============================================================================
 # 4. 메인 로직 (Ver 5.8 - 구문 에러 해결)
 # ==============================================================================
 user_db = {} # [안전장치] 일단 빈 딕셔너리로 초기화 (파일 로드 실패 시 에러 방지)
 
-user_db_id, renewal_id, realtime_id, monthly_files, realtime_meta = get_all_files()
-
-if user_db_id:
-    user_db = load_json_file(user_db_id)
+start_warmup()
 
 st.markdown(f'<div class="version-badge">{APP_VERSION}</div>', unsafe_allow_html=True)
 
 if not st.session_state.get('login_status'):
-    calendar_img_b64 = get_image_base64("empty_calendar.png")
-    calendar_img_src = f"data:image/png;base64,{calendar_img_b64}" if calendar_img_b64 else ""
+    calendar_img_src = ASSETS.images["empty_calendar.png"]
 
     st.markdown(f"""
         <div class="login-header">
@@ -338,10 +1133,14 @@ if not st.session_state.get('login_status'):
         uid = st.text_input("아이디", placeholder="이름을 입력하세요").replace(" ", "")
         upw = st.text_input("비밀번호", type="password")
         if st.form_submit_button("로그인", use_container_width=True):
+            # 로그인 화면은 드라이브를 기다리지 않고 먼저 그리고, 사용자 DB 는 제출 시점에 읽음 (대부분 예열 완료 상태)
+            user_db_id, _, _, _, _, file_versions, _ = get_all_files()
+            if user_db_id: user_db = load_json_file(user_db_id, file_versions.get(user_db_id, ""))
             if uid in user_db and verify_password(user_db[uid]['pw'], upw):
                 st.session_state.login_status = True; st.session_state.user_id = uid; st.session_state.user_db = user_db; st.rerun()
             else: st.error("정보를 확인해주세요.")
 else:
+    user_db_id, renewal_id, realtime_id, monthly_files, realtime_meta, file_versions, rules_id = get_all_files()
     login_uid = st.session_state.user_id
     login_uinfo = st.session_state.user_db.get(login_uid, {})
     if 'admin_mode' not in st.session_state: st.session_state.admin_mode = False
@@ -349,8 +1148,7 @@ else:
 
     admin_uinfo = st.session_state.user_db.get(login_uid, {})
     
-    img_b64 = get_image_base64("character.png")
-    img_src = f"data:image/png;base64,{img_b64}" if img_b64 else ""
+    img_src = ASSETS.images["character.png"]
 
     st.markdown(f"""
     <div class="profile-card">
@@ -370,40 +1168,36 @@ else:
             st.selectbox("조회할 사용자 선택", all_users, index=all_users.index(login_uid), key="impersonate_user")
             if target_uid != login_uid: st.markdown(f'<div class="viewing-alert">👀 현재 <b>{target_uid}</b>님의 데이터를 조회 중입니다.</div>', unsafe_allow_html=True)
 
-    tab1, tab2, tab3, tab4 = st.tabs(["📌 잔여", "📅 월별", "🔄 갱신", "⚙️ 설정"])
+    show_roster = login_uinfo.get('role') == 'admin' and st.session_state.admin_mode
+    tab_labels = ["📌 잔여", "📅 월별", "🔄 갱신", "⚙️ 설정"] + (["👥 전체", "🩺 진단"] if show_roster else [])
+    # 선택된 탭만 계산하고(탭 전환 시 rerun), 탭 안의 위젯 조작은 그 탭(fragment)만 다시 실행
+    try: tabs = st.tabs(tab_labels, key="main_tab", on_change="rerun")
+    except TypeError: tabs = st.tabs(tab_labels)  # 탭 상태 추적을 지원하지 않는 버전: 모든 탭 계산
     
     def render_metric_card(label1, val1, label2, val2, is_main=False, both_large=False):
         val2_class = "metric-value-large" if both_large else "metric-value-sub"
         st.markdown(f"""<div class="metric-box"><div class="metric-item"><span class="metric-label">{label1}</span><span class="metric-value-large">{val1}</span></div><div class="metric-divider"></div><div class="metric-item"><span class="metric-label">{label2}</span><span class="{val2_class}">{val2}</span></div></div>""", unsafe_allow_html=True)
 
-    renewal_df = fetch_excel(renewal_id, is_renewal=True) if renewal_id else pd.DataFrame()
-
-    with tab1:
+    @st.fragment
+    @timed("render.tab1")
+    def render_tab1():
         st.markdown('<div class="universal-spacer"></div>', unsafe_allow_html=True)
         st.markdown('<div class="tab-section-header">현재 잔여 연차 확인</div>', unsafe_allow_html=True)
         if monthly_files:
             latest_fname = monthly_files[0]['name']
-            df = fetch_excel(monthly_files[0]['id'])
-            st.session_state.realtime_data = load_json_file(realtime_id) if realtime_id else {}
+            leave_index = get_leave_index(monthly_files[0]['id'], get_file_version(monthly_files[0]))
+            rt_model = get_realtime_model(realtime_id, get_file_version(realtime_meta), (realtime_meta or {}).get('modifiedTime', ''))
             
-            me = df[df['이름'] == target_uid]
-            if not me.empty:
-                base_remain = float(me.iloc[0]['잔여'])
-                bonus = get_smart_renewal_bonus(target_uid, latest_fname)
-                
-                try:
-                    match = re.search(r'(\d{4})_(\d+)', latest_fname)
-                    if match:
-                        f_year, f_month = int(match.group(1)), int(match.group(2))
-                        last_day = calendar.monthrange(f_year, f_month)[1]
-                        file_end_date = datetime.date(f_year, f_month, last_day)
-                    else: file_end_date = datetime.date(2000, 1, 1)
-                except: file_end_date = datetime.date(2000, 1, 1)
-
-                special_bonus = get_kim_special_calc(target_uid, mode='incremental', base_file_date=file_end_date)
+            me = leave_index.get(target_uid)
+            if me is not None:
+                base_remain = me.remain
+                accruals = get_accrual_bonuses(rules_id, file_versions.get(rules_id, ""), renewal_id, file_versions.get(renewal_id, ""),
+                                               get_kst_today(), get_file_end_date(latest_fname)).get(target_uid, NO_ACCRUAL)
+                bonus = accruals.renewal
+                special_bonus = accruals.special
                 
                 rt_used = 0.0
-                rt_msg = ""
+                rt_msg_formatted = ""
                 rt_valid = False
                 future_used_cnt = 0
                 
@@ -411,24 +1205,17 @@ else:
                     file_month = int(re.search(r'(\d+)월', latest_fname).group(1))
                     today_kst = get_kst_today()
                     
-                    if today_kst.month > file_month and target_uid in st.session_state.realtime_data:
-                        if realtime_meta:
-                            mod_time_utc = parser.parse(realtime_meta['modifiedTime'])
-                            mod_time_kst = mod_time_utc + datetime.timedelta(hours=9)
-                            
-                            if mod_time_kst.month == today_kst.month and mod_time_kst.year == today_kst.year:
-                                rt_data = st.session_state.realtime_data[target_uid]
-                                rt_used = rt_data.get('used', 0.0)
-                                rt_msg = rt_data.get('details', '')
-                                rt_valid = True
-                                dates = re.findall(r'(\d+)일', rt_msg)
-                                if any(int(d) >= today_kst.day for d in dates):
-                                    future_used_cnt = 1
-                            else:
-                                rt_valid = False
+                    rt_data = rt_model.users.get(target_uid)
+                    if today_kst.month > file_month and rt_data is not None:
+                        if realtime_applies(rt_model, file_month, today_kst):
+                            rt_used = rt_data.used
+                            rt_msg_formatted = rt_data.details_formatted
+                            rt_valid = True
+                            if any(d >= today_kst.day for d in rt_data.days):
+                                future_used_cnt = 1
                 except: pass
 
-                if pd.isna(base_remain): final_str = "∞"
+                if math.isnan(base_remain): final_str = "∞"
                 else:
                     total_calc = base_remain + bonus + special_bonus - rt_used
                     final_str = format_leave_num(total_calc) + "개"
@@ -440,15 +1227,11 @@ else:
                         future_msg = " (예정 포함)" if future_used_cnt > 0 else ""
                         st.markdown(f"<span class='realtime-badge'>📉 실시간{future_msg} -{format_leave_num(rt_used)}개 반영됨</span>", unsafe_allow_html=True)
                         
-                        update_time = st.session_state.realtime_data.get('__last_updated__', '')
+                        update_time = rt_model.last_updated
                         if update_time:
                             st.markdown(f"<div class='update-time-caption'>(사내일정 자동 업데이트 적용 : {update_time} 기준)</div>", unsafe_allow_html=True)
                         
-                        try:
-                            rt_msg_formatted = re.sub(r'(\d+)일', f'{today_kst.month}월 \\1일', rt_msg)
-                            st.info(f"📝 **내역:** {rt_msg_formatted}")
-                        except:
-                            st.info(f"📝 **내역:** {rt_msg}")
+                        st.info(f"📝 **내역:** {rt_msg_formatted}")
 
                     elif not rt_valid and today_kst.month > file_month:
                         st.markdown(f"<span class='stale-badge'>📉 실시간 데이터 대기 중 (연/반차 사용 시 반영됨)</span>", unsafe_allow_html=True)
@@ -456,56 +1239,83 @@ else:
                 render_metric_card("현재 예상 잔여", final_str, "기준 파일", latest_fname, is_main=True)
             else: st.warning("데이터가 없습니다.")
 
-    with tab2:
+    @st.fragment
+    @timed("render.tab2")
+    def render_tab2():
         st.markdown('<div class="universal-spacer"></div>', unsafe_allow_html=True)
         st.markdown('<div class="tab-section-header">월별 사용 내역 조회 (월말 기준)</div>', unsafe_allow_html=True)
-        opts = {f['name']: f['id'] for f in monthly_files}
+        if monthly_files: start_archive_prefetch(get_archive_key(monthly_files))
+        opts = {f['name']: f for f in monthly_files}
         sel = st.selectbox("월 선택", list(opts.keys()), label_visibility="collapsed")
         if sel:
-            df = fetch_excel(opts[sel], filename=sel)
-            me = df[df['이름'] == target_uid]
-            if not me.empty:
-                r = me.iloc[0]
-                used_str = format_leave_num(float(r['사용개수']))
-                remain_str = format_leave_num(float(r['잔여']))
+            me = get_leave_index(opts[sel]['id'], get_file_version(opts[sel]), filename=sel).get(target_uid)
+            if me is not None:
+                used_str = format_leave_num(me.used)
+                remain_str = format_leave_num(me.remain)
                 render_metric_card("이번달 사용", f"{used_str}개", "당월 잔여", f"{remain_str}개", both_large=True)
-                st.info(f"내역: {r['사용내역']}")
+                st.info(f"내역: {me.usage}")
+
+        # 연간 누적·기간 조회: 켰을 때만 전체 월 타임라인을 만들고(이후엔 바뀐 달만 반영) 인덱스에서 바로 응답
+        if monthly_files and st.toggle("📊 연간 누적 · 기간 조회", key="show_timeline"):
+            timeline = get_timeline(get_archive_key(monthly_files))
+            years = sorted({y for y, _ in timeline.months}, reverse=True)
+            if years:
+                today = get_kst_today()
+                year = today.year if today.year in years else years[0]
+                totals = timeline_monthly_totals(timeline, target_uid, year)
+                file_months = [m for y, m in timeline.months if y == year]
+                render_metric_card(f"{year}년 누적 사용", f"{format_leave_num(float(totals.sum()))}개", "반영된 달", f"{file_months[0]}~{file_months[-1]}월")
+                st.caption(" · ".join(f"{m}월 {format_leave_num(float(totals[m - 1]))}" for m in file_months))
+                period = st.date_input("기간 조회", value=(datetime.date(year, 1, 1), today), key="timeline_range")
+                if len(period) == 2:
+                    dates, labels, weights = timeline_range(timeline, target_uid, period[0], period[1])
+                    if len(dates):
+                        items = ", ".join(f"{d.month}월 {d.day}일({l})" for d, l in zip(dates.tolist(), labels.tolist()))
+                        st.info(f"**{period[0]} ~ {period[1]}** 사용 {format_leave_num(float(weights.sum()))}개\n\n{items}")
+                    else: st.info(f"**{period[0]} ~ {period[1]}** 사용 내역 없음")
 
-    with tab3:
+    @st.fragment
+    @timed("render.tab3")
+    def render_tab3():
+        renewal_index = get_renewal_index(renewal_id, file_versions.get(renewal_id, ""))
         st.markdown('<div class="universal-spacer"></div>', unsafe_allow_html=True)
         st.markdown('<div class="tab-section-header">연차 갱신 및 발생 내역</div>', unsafe_allow_html=True)
         
-        if target_uid == "김동준":
-            special_accrued_total = get_kim_special_calc("김동준", mode='total')
-            st.info("📅 **2026-07-01** 1년 근속 갱신 예정 (입사일: 2025-07-01)")
+        first_year_rule = get_accrual_rules(rules_id, file_versions.get(rules_id, "")).get(target_uid)
+        if first_year_rule is not None:
+            r = first_year_rule
+            now_kst = get_kst_today()
+            pending = now_kst < r.anniversary
+            if pending: st.info(f"📅 **{r.anniversary}** 1년 근속 갱신 예정 (입사일: {r.hire_date})")
+            else: st.success(f"✅ **{r.anniversary}** 1년 근속 갱신 완료 (입사일: {r.hire_date})")
             st.markdown(f"""
             <div class="renewal-box">
-                <div class="renewal-number">+15개</div>
-                <div class="renewal-label">추가 발생 예정</div>
+                <div class="renewal-number">+{format_leave_num(r.anniversary_count)}개</div>
+                <div class="renewal-label">{"추가 발생 예정" if pending else "추가 발생"}</div>
             </div>
             """, unsafe_allow_html=True)
             
-            if get_kst_today() < datetime.date(2026, 7, 1):
+            if pending:
+                special_accrued_total = sum(1.0 for d in r.monthly_dates if now_kst >= d)
+                last = r.monthly_dates[-1]
                 st.markdown(f"""
                     <div class="special-rule-box">
                     [근속 1년 미만 근로자 연차 갱신규칙]<br>
-                    2026년 6월 1일까지 매월 1일 연차 1개 발생<br>
+                    {last.year}년 {last.month}월 {last.day}일까지 매월 {r.hire_date.day}일 연차 1개 발생<br>
                     (현재까지 발생분: +{format_leave_num(special_accrued_total)}개)
                     </div>
                 """, unsafe_allow_html=True)
             
-        elif not renewal_df.empty:
-            me = renewal_df[renewal_df['이름'] == target_uid]
-            if not me.empty:
-                r = me.iloc[0]
-                try:
-                    rdt = pd.to_datetime(r['갱신일']).date()
+        elif renewal_index:
+            me = renewal_index.get(target_uid)
+            if me is not None:
+                if me.date is not None:
                     now_kst = get_kst_today()
-                    if rdt > now_kst: st.info(f"📅 **{r['갱신일']}** 갱신 예정")
-                    else: st.success(f"✅ **{r['갱신일']}** 갱신 완료")
-                except: st.write(f"📅 {r['갱신일']}")
+                    if me.date > now_kst: st.info(f"📅 **{me.date_str}** 갱신 예정")
+                    else: st.success(f"✅ **{me.date_str}** 갱신 완료")
+                else: st.write(f"📅 {me.date_str}")
                 
-                val = format_leave_num(float(r['갱신개수']))
+                val = format_leave_num(me.count)
                 st.markdown(f"""
                 <div class="renewal-box">
                     <div class="renewal-number">+{val}개</div>
@@ -516,7 +1326,9 @@ else:
         
         st.markdown('<div class="bottom-spacer"></div>', unsafe_allow_html=True)
 
-    with tab4:
+    @st.fragment
+    @timed("render.tab4")
+    def render_tab4():
         st.markdown('<div class="universal-spacer"></div>', unsafe_allow_html=True)
         st.markdown('<div class="tab-section-header">설정 및 로그아웃</div>', unsafe_allow_html=True)
         p1 = st.text_input("새 비번", type="password")
@@ -525,13 +1337,13 @@ else:
         if st.button("저장", type="primary", use_container_width=True):
             if p1 and p2:
                 if p1 == p2:
-                    st.session_state.user_db[target_uid]['pw'] = hash_password(p1)
-                    st.session_state.user_db[target_uid]['first_login'] = False
-                    if save_user_db(user_db_id, st.session_state.user_db):
-                        st.cache_data.clear()
+                    saved = patch_user_db(user_db_id, target_uid, {'pw': hash_password(p1), 'first_login': False})
+                    if saved is not None:
+                        st.session_state.user_db = saved[0]
                         st.success("완료")
                         time.sleep(1)
                         st.rerun()
+                    else: st.error("저장 실패 (잠시 후 다시 시도)")
                 else: st.error("불일치")
             else: st.error("입력 필요")
         
@@ -539,3 +1351,59 @@ else:
             st.session_state.login_status = False
             st.session_state.admin_mode = False
             st.rerun()
+
+    @st.fragment
+    @timed("render.roster")
+    def render_roster():
+        st.markdown('<div class="universal-spacer"></div>', unsafe_allow_html=True)
+        st.markdown('<div class="tab-section-header">전 직원 예상 잔여 (관리자)</div>', unsafe_allow_html=True)
+        if monthly_files:
+            latest = monthly_files[0]
+            roster = get_roster(latest['id'], get_file_version(latest), latest['name'],
+                                rules_id, file_versions.get(rules_id, ""), renewal_id, file_versions.get(renewal_id, ""),
+                                realtime_id, get_file_version(realtime_meta), (realtime_meta or {}).get('modifiedTime', ''), get_kst_today())
+            q = st.text_input("이름 검색", key="roster_query", placeholder="이름 일부 입력").replace(" ", "")
+            sort_col = st.selectbox("정렬", ROSTER_COLUMNS, index=ROSTER_COLUMNS.index('예상잔여'), key="roster_sort")
+            view = roster[roster['이름'].str.contains(q, regex=False)] if q else roster
+            view = view.sort_values(sort_col, kind="stable", na_position="last").reset_index(drop=True)
+            st.caption(f"기준 파일: {latest['name']} · {len(view)}명")
+            st.dataframe(view, hide_index=True, width="stretch")
+            stamp = get_kst_today().strftime("%Y%m%d")
+            c1, c2 = st.columns(2)
+            with c1: st.download_button("CSV 내보내기", data=lambda: view.to_csv(index=False).encode('utf-8-sig'), file_name=f"연차현황_{stamp}.csv", mime="text/csv", on_click="ignore", width="stretch")
+            with c2: st.download_button("엑셀 내보내기", data=lambda: roster_to_xlsx(view), file_name=f"연차현황_{stamp}.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", on_click="ignore", width="stretch")
+        else: st.info("월별 파일이 없습니다.")
+
+    @st.fragment
+    @timed("render.diag")
+    def render_diag():
+        st.markdown('<div class="universal-spacer"></div>', unsafe_allow_html=True)
+        st.markdown('<div class="tab-section-header">진단 (관리자)</div>', unsafe_allow_html=True)
+        # 수집 여부는 프로세스 공용 → 화면에는 현재 값을 보여 주고, 직접 바꿨을 때만 반영
+        st.session_state['metrics_enabled'] = METRICS['enabled']
+        st.toggle("계측 수집", key="metrics_enabled", on_change=lambda: METRICS.update(enabled=st.session_state['metrics_enabled']))
+        span_df, cache_df, recent = metrics_tables()
+        since = datetime.datetime.fromtimestamp(METRICS['since'], datetime.timezone(datetime.timedelta(hours=9)))
+        st.caption(f"저장소: {STORAGE_BACKEND} · 집계 시작: {since:%Y-%m-%d %H:%M:%S} (KST) · 프로세스 공용")
+        breaker, catalog_state = get_storage().status(), get_catalog_state()
+        age = f"{time.time() - catalog_state['fetched']:.0f}초 전" if catalog_state['fetched'] else "디스크 스냅샷"
+        st.caption(f"저장소 브레이커: {breaker['state']} (연속 실패 {breaker['failures']}" + (f", {breaker['retry_in']:.0f}초 후 재시도" if breaker['state'] == "open" else "") + ")"
+                   f" · 목록 갱신: {age}" + (f" · 이전 버전 유지 {len(catalog_state['stale'])}개" if catalog_state['stale'] else "")
+                   + (f" · 마지막 오류: {catalog_state['error']}" if catalog_state['error'] else ""))
+        warm = get_warmup_state()['last']
+        if warm: st.caption(f"마지막 예열: {datetime.datetime.fromtimestamp(warm['finished'], since.tzinfo):%H:%M:%S} · {warm['total_ms']:.0f}ms · " + ", ".join(f"{k} {v:.0f}ms" for k, v in warm['steps'].items()))
+        if not METRICS['enabled'] and span_df.empty: st.info("계측이 꺼져 있습니다. 켜면 이후 요청부터 집계됩니다. (PTO_METRICS=1 로 기본값 설정)")
+        st.markdown("**구간별 소요 시간**")
+        st.dataframe(span_df, hide_index=True, width="stretch")
+        st.markdown("**캐시 적중/미스**")
+        st.dataframe(cache_df, hide_index=True, width="stretch")
+        with st.expander(f"최근 기록 {len(recent)}건"):
+            st.code("\n".join(json.dumps(e, ensure_ascii=False, default=str) for e in reversed(recent)) or "-", language="json")
+        if st.button("집계 초기화", width="stretch"):
+            reset_metrics()
+            st.rerun(scope="fragment")
+
+    renderers = [render_tab1, render_tab2, render_tab3, render_tab4] + ([render_roster, render_diag] if show_roster else [])
+    for tab, render in zip(tabs, renderers):
+        if getattr(tab, 'open', None) is False: continue
+        with tab: render()
@@ -0,0 +1,367 @@
+# 월별 근태 / 연차 갱신 엑셀 파서
+# - app.py 의 fetch_excel 과 tests/bench_parser.py 가 함께 사용 (streamlit 없이 import 가능)
+# - parse_*_sheet        : openpyxl read-only 스트리밍 1회 + 벡터화 분류 (기본 경로)
+# - parse_monthly_matrix : 월별 파일 → UsageMatrix (직원 × 일자 코드 행렬, app.py 의 캐시 형태)
+# - parse_*_sheet_legacy : 기존 pd.read_excel 2회 읽기 경로 (fallback / 결과 비교 기준)
+# - build_sidecar / read_sidecar : 엑셀 옆에 두는 정규화된 Parquet 사이드카 (python leave_parser.py 폴더 로 일괄 변환)
+
+import argparse
+import calendar
+import datetime
+import hashlib
+import io
+import os
+import re
+import time
+from collections import namedtuple
+from itertools import chain
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+def get_month_prefix(filename):
+    if filename:
+        match = re.search(r'_(\d+)월', filename)
+        if match: return f"{match.group(1)}월 "
+    return ""
+
+def parse_renewal_sheet_legacy(content):
+    df_meta = pd.read_excel(content, header=None, nrows=3)
+    try: target_year = int(df_meta.iloc[1, 0])
+    except: target_year = datetime.datetime.now().year
+    content.seek(0)
+    df = pd.read_excel(content, header=3)
+    df.columns = df.columns.astype(str).str.replace(" ", "").str.replace("\n", "")
+    parsed = []
+    for i, row in df.iterrows():
+        name = str(row.iloc[0]).replace(" ", "").strip()
+        if name and name != "nan" and name != "이름":
+            try:
+                month = int(row['월']); day = int(row['일'])
+                renewal_date = f"{target_year}-{month:02d}-{day:02d}"
+                count = row.get('올해발생연차개수', 0)
+                parsed.append({'이름': name, '갱신일': renewal_date, '갱신개수': float(count)})
+            except: continue
+    return pd.DataFrame(parsed)
+
+def parse_monthly_sheet_legacy(content, filename=None):
+    date_prefix = get_month_prefix(filename)
+    df_raw = pd.read_excel(content, header=None)
+    name_row_idx = -1
+    for i, row in df_raw.iterrows():
+        if any("성명" in str(x).replace(" ", "") for x in row.astype(str).values):
+            name_row_idx = i; break
+    if name_row_idx == -1: return pd.DataFrame()
+    remain_col_idx = -1
+    for r_idx in [name_row_idx, name_row_idx + 1]:
+        if r_idx < len(df_raw):
+            for c_idx, val in enumerate(df_raw.iloc[r_idx]):
+                if "연차잔여일" in str(val).replace(" ", ""):
+                    remain_col_idx = c_idx; break
+        if remain_col_idx != -1: break
+    content.seek(0)
+    df = pd.read_excel(content, header=name_row_idx)
+    df.columns = df.columns.astype(str).str.replace(" ", "").str.replace("\n", "")
+    date_cols = [c for c in df.columns if str(c).isdigit() and 1 <= int(str(c)) <= 31]
+    parsed = []
+    for i in range(len(df)):
+        row = df.iloc[i]
+        name = str(row.get('성명', '')).replace(" ", "").strip()
+        if name and name != "nan":
+            usage, count = [], 0.0
+            for d in date_cols:
+                val = str(row[d])
+                if "연차" in val or "휴가" in val: 
+                    usage.append(f"{date_prefix}{d}일({val.strip()})")
+                    count += 1.0
+                elif "반차" in val: 
+                    usage.append(f"{date_prefix}{d}일(반차)")
+                    count += 0.5
+            remain = 0.0
+            if remain_col_idx != -1 and i + 1 < len(df):
+                try: remain = float(df.iloc[i+1, remain_col_idx])
+                except: remain = 0.0
+            parsed.append({'이름': name, '사용내역': ", ".join(usage) if usage else "-", '사용개수': count, '잔여': remain})
+    return pd.DataFrame(parsed)
+
+# --- 단일 패스 파서 (openpyxl read-only 스트리밍 1회 + 벡터화 분류) ---
+# pd.read_excel 과 같은 값 규칙을 따름: 빈 셀은 'nan', 정수형 실수는 정수로 표기, 끝쪽 빈 행은 버림
+def _cell_str(v):
+    if v is None or v == "": return "nan"
+    if isinstance(v, float) and v.is_integer(): return str(int(v))
+    return str(v)
+
+def _cell_float(v):
+    if v is None or v == "": return float('nan')
+    try: return float(v)
+    except: return 0.0
+
+def _header_labels(header):
+    # pd.read_excel 의 컬럼명 처리(Unnamed 채움, 중복 라벨은 '.1' 로 밀림 → 첫 번째만 유효)와 동일하게 정규화
+    labels, seen = [], set()
+    for c_idx, v in enumerate(header):
+        raw = _cell_str(v) if v is not None and v != "" else f"Unnamed: {c_idx}"
+        labels.append(None if raw in seen else raw.replace(" ", "").replace("\n", ""))
+        seen.add(raw)
+    return labels
+
+def iter_sheet_rows(content):
+    wb = load_workbook(content, read_only=True, data_only=True, keep_links=False)
+    try:
+        for row in wb.worksheets[0].iter_rows(values_only=True): yield row
+    finally: wb.close()
+
+def parse_renewal_sheet(content):
+    rows = list(iter_sheet_rows(content))
+    while rows and rows[-1].count(None) == len(rows[-1]): rows.pop()
+    try: target_year = int(rows[1][0])
+    except: target_year = datetime.datetime.now().year
+    labels = _header_labels(rows[3])
+    width = max(len(r) for r in rows)
+    col = {l: i for i, l in reversed(list(enumerate(labels))) if l is not None}
+    parsed = []
+    for row in rows[4:]:
+        row = row + (None,) * (width - len(row))
+        name = _cell_str(row[0]).replace(" ", "").strip()
+        if name and name != "nan" and name != "이름":
+            try:
+                month = int(row[col['월']]); day = int(row[col['일']])
+                renewal_date = f"{target_year}-{month:02d}-{day:02d}"
+                count = row[col['올해발생연차개수']] if '올해발생연차개수' in col else 0
+                if count is None or count == "": count = float('nan')
+                parsed.append({'이름': name, '갱신일': renewal_date, '갱신개수': float(count)})
+            except: continue
+    return pd.DataFrame(parsed)
+
+# --- 월별 사용 행렬: 직원 × 일자 칸마다 작은 정수 코드 (표시 문자열·개수는 여기서 파생) ---
+# codes[i, j] = 0 이면 사용 없음, k 이면 labels[k] (반차는 모두 '반차', 연차·휴가는 셀 문구 그대로)
+# kinds[k] = 라벨 종류 (KIND_*), KIND_WEIGHTS[kind] = 사용 개수 (연차·휴가 1, 반차 0.5)
+# 파일 이름(월 접두어)과 무관하므로 같은 파일은 한 번만 파싱해 모든 표시 형태가 공유
+KIND_NONE, KIND_FULL, KIND_HALF, KIND_VACATION = 0, 1, 2, 3
+KIND_WEIGHTS = np.array([0.0, 1.0, 0.5, 1.0])
+UsageMatrix = namedtuple('UsageMatrix', ['names', 'index', 'days', 'codes', 'labels', 'kinds', 'remain'])
+
+def make_usage_matrix(names, days, codes, labels, kinds, remain):
+    index = {}
+    for i, name in enumerate(names): index.setdefault(name, i)
+    arrays = [np.asarray(days, dtype=np.int8), np.asarray(codes), np.asarray(kinds, dtype=np.uint8), np.asarray(remain, dtype=float)]
+    for arr in arrays: arr.flags.writeable = False  # 세션 간 공유 (읽기 전용)
+    days, codes, kinds, remain = arrays
+    return UsageMatrix(tuple(names), index, days, codes, tuple(labels), kinds, remain)
+
+EMPTY_MATRIX = make_usage_matrix([], [], np.zeros((0, 0), dtype=np.uint8), [""], [KIND_NONE], [])
+
+def classify_cells(flat):
+    # 셀 문구 Series → (칸별 라벨 코드, 라벨, 라벨 종류) : 연차/휴가 포함이면 그 문구, 반차만 포함이면 '반차'
+    full = flat.str.contains("연차|휴가", na=False).to_numpy()
+    half = flat.str.contains("반차", regex=False, na=False).to_numpy() & ~full
+    hit = np.flatnonzero(full | half)
+    text = np.where(full[hit], flat.iloc[hit].str.strip().to_numpy(), "반차")
+    hit_codes, uniques = pd.factorize(text)
+    labels = [""] + list(uniques)
+    kinds = [KIND_NONE] + [KIND_HALF if t == "반차" else KIND_FULL if "연차" in t else KIND_VACATION for t in uniques]
+    codes = np.zeros(len(flat), dtype=np.min_scalar_type(len(labels)))
+    codes[hit] = hit_codes + 1
+    return codes, labels, kinds
+
+def build_usage_matrix(rows):
+    header = None
+    for row in rows:
+        if any(isinstance(v, str) and "성명" in v.replace(" ", "") for v in row):
+            header = row; break
+    if header is None: return EMPTY_MATRIX
+    first = next(rows, None)
+
+    remain_col_idx = -1
+    for cand in [header, first]:
+        if cand is None: continue
+        for c_idx, val in enumerate(cand):
+            if "연차잔여일" in _cell_str(val).replace(" ", ""):
+                remain_col_idx = c_idx; break
+        if remain_col_idx != -1: break
+
+    labels = _header_labels(header)
+    if "성명" not in labels: return EMPTY_MATRIX
+    name_col = labels.index("성명")
+    date_idx = [i for i, l in enumerate(labels) if l is not None and l.isdigit() and 1 <= int(l) <= 31]
+    days = [int(labels[i]) for i in date_idx]
+
+    # 필요한 열(성명, 날짜, 잔여)만 남기며 한 번만 스트리밍
+    width = max(len(header), remain_col_idx + 1)
+    pick_dates = itemgetter(*date_idx) if len(date_idx) > 1 else (lambda r: tuple(r[i] for i in date_idx))
+    names, remains, cells = [], [], []
+    last_nonempty = -1
+    for i, row in enumerate(rows if first is None else chain([first], rows)):
+        if len(row) < width: row = row + (None,) * (width - len(row))
+        if row.count(None) != len(row): last_nonempty = i
+        names.append(row[name_col])
+        remains.append(row[remain_col_idx] if remain_col_idx != -1 else None)
+        cells.append(pick_dates(row))
+    n = last_nonempty + 1
+    del names[n:], remains[n:], cells[n:]
+
+    valid, valid_names = [], []
+    for i, v in enumerate(names):
+        name = _cell_str(v).replace(" ", "").strip()
+        if name and name != "nan":
+            valid.append(i); valid_names.append(name)
+    if not valid: return EMPTY_MATRIX
+
+    # 날짜 블록 전체를 한 번에 분류
+    n_valid, n_days = len(valid), len(date_idx)
+    codes, cell_labels, kinds = np.zeros(0, dtype=np.uint8), [""], [KIND_NONE]
+    if n_days:
+        block = np.empty((n_valid, n_days), dtype=object)
+        block[:] = [cells[i] for i in valid]
+        codes, cell_labels, kinds = classify_cells(pd.Series(block.ravel()))
+    remain = [_cell_float(remains[i + 1]) if remain_col_idx != -1 and i + 1 < n else 0.0 for i in valid]
+    return make_usage_matrix(valid_names, days, codes.reshape(n_valid, n_days), cell_labels, kinds, remain)
+
+def usage_frame(matrix, date_prefix=""):
+    # 행렬 → 기존 표 형태 (이름 / 사용내역 "3월 5일(연차), ..." / 사용개수 / 잔여)
+    n = len(matrix.names)
+    if not n: return pd.DataFrame()
+    usage = np.full(n, "-", dtype=object)
+    used = np.zeros(n)
+    hit_rows, hit_cols = np.nonzero(matrix.codes)  # 행 우선 → 직원별 날짜순
+    if len(hit_rows):
+        hit_codes = matrix.codes[hit_rows, hit_cols]
+        text = np.asarray(matrix.labels, dtype=object)[hit_codes]
+        days = matrix.days.astype(str).astype(object)[hit_cols]
+        joined = pd.Series(date_prefix + days + "일(" + text + ")").groupby(hit_rows, sort=True).agg(", ".join)
+        usage[joined.index.to_numpy()] = joined.to_numpy()
+        used = np.bincount(hit_rows, weights=KIND_WEIGHTS[matrix.kinds[hit_codes]], minlength=n)
+    return pd.DataFrame({'이름': list(matrix.names), '사용내역': usage, '사용개수': used, '잔여': matrix.remain.copy()})
+
+def matrix_events(matrix, year, month):
+    # 사용한 칸만 (이름, 날짜, 라벨, 개수) 배열로 → 여러 달을 합친 타임라인의 재료
+    rows, cols = np.nonzero(matrix.codes)
+    days = matrix.days[cols].astype(int)
+    keep = days <= calendar.monthrange(year, month)[1]
+    rows, cols, days = rows[keep], cols[keep], days[keep]
+    codes = matrix.codes[rows, cols]
+    dates = np.datetime64(f"{year:04d}-{month:02d}-01") + (days - 1).astype('timedelta64[D]')
+    return (np.asarray(matrix.names, dtype=object)[rows], dates,
+            np.asarray(matrix.labels, dtype=object)[codes], KIND_WEIGHTS[matrix.kinds[codes]])
+
+def matrix_to_frame(matrix):
+    # 스냅샷(Parquet) 저장용: 이름·잔여 + 일자별 코드 열, 라벨은 attrs 에 보관
+    df = pd.DataFrame(matrix.codes, columns=[str(d) for d in matrix.days])
+    df.insert(0, '잔여', matrix.remain)
+    df.insert(0, '이름', list(matrix.names))
+    df.attrs['labels'] = list(matrix.labels)
+    df.attrs['kinds'] = [int(k) for k in matrix.kinds]
+    return df
+
+def matrix_from_frame(df):
+    if 'labels' not in df.attrs or 'kinds' not in df.attrs: return None  # attrs 를 보존하지 못한 파일
+    day_cols = [c for c in df.columns if c not in ('이름', '잔여')]
+    codes = df[day_cols].to_numpy(dtype=np.min_scalar_type(len(df.attrs['labels'])))
+    return make_usage_matrix(df['이름'].tolist(), [int(c) for c in day_cols], codes, df.attrs['labels'], df.attrs['kinds'], df['잔여'].to_numpy())
+
+def _frame_rows(content):
+    # pd.read_excel(header=None) 결과를 openpyxl 과 같은 행 튜플로 (빈 칸은 None)
+    df_raw = pd.read_excel(content, header=None)
+    return df_raw.astype(object).where(df_raw.notna(), None).itertuples(index=False, name=None)
+
+def parse_monthly_matrix(content):
+    try: return build_usage_matrix(iter_sheet_rows(content))
+    except:
+        # openpyxl 로 열 수 없는 파일(.xls 등)은 pandas 로 읽어 같은 규칙으로 변환
+        try:
+            content.seek(0)
+            return build_usage_matrix(_frame_rows(content))
+        except: return EMPTY_MATRIX
+
+def parse_monthly_sheet(content, filename=None):
+    return usage_frame(build_usage_matrix(iter_sheet_rows(content)), get_month_prefix(filename))
+
+def parse_excel_content(content, filename=None, is_renewal=False):
+    try:
+        if is_renewal: return parse_renewal_sheet(content)
+        return parse_monthly_sheet(content, filename)
+    except:
+        # openpyxl 로 열 수 없는 파일(.xls 등)은 기존 pandas 경로로 처리
+        try:
+            content.seek(0)
+            if is_renewal: return parse_renewal_sheet_legacy(content)
+            return parse_monthly_sheet_legacy(content, filename)
+        except: return pd.DataFrame()
+
+# ==============================================================================
+# 사이드카: 엑셀 원본과 같은 폴더에 두는 "{원본 이름}.parquet"
+# 월별은 matrix_to_frame 형태, 갱신은 parse_renewal_sheet 결과 표. attrs 에 원본 버전(md5)을 기록해 같을 때만 사용
+# ==============================================================================
+SIDECAR_SUFFIX = ".parquet"
+SIDECAR_MIMETYPE = "application/vnd.apache.parquet"
+SIDECAR_FORMAT = 1
+
+def is_renewal_name(filename):
+    return "renewal" in filename or "갱신" in filename
+
+def sidecar_bytes(df, source_version, is_renewal=False):
+    df = df.copy(deep=False)
+    df.attrs.update(sidecar_format=SIDECAR_FORMAT, source_version=source_version, kind="renewal" if is_renewal else "monthly")
+    out = io.BytesIO()
+    df.to_parquet(out, index=False)
+    return out.getvalue()
+
+def build_sidecar(content, source_version, is_renewal=False):
+    # 엑셀 내용 → 사이드카 바이트 (읽을 수 있는 행이 없으면 None)
+    if is_renewal: df = parse_excel_content(content, is_renewal=True)
+    else:
+        matrix = parse_monthly_matrix(content)
+        df = matrix_to_frame(matrix) if matrix.names else pd.DataFrame()
+    return None if df.empty else sidecar_bytes(df, source_version, is_renewal)
+
+def read_sidecar(data, source_version, is_renewal=False):
+    # 형식·종류·원본 버전이 모두 맞으면 월별은 UsageMatrix, 갱신은 DataFrame, 아니면 None
+    try: df = pd.read_parquet(io.BytesIO(data))
+    except Exception: return None
+    attrs = df.attrs
+    if (attrs.get('sidecar_format') != SIDECAR_FORMAT or attrs.get('source_version') != source_version
+            or attrs.get('kind') != ("renewal" if is_renewal else "monthly")): return None
+    if not is_renewal: return matrix_from_frame(df)
+    df.attrs = {}
+    return df
+
+def sidecar_source_version(path):
+    try: return pd.read_parquet(path).attrs.get('source_version')
+    except Exception: return None
+
+def convert_folder(folder, force=False):
+    # 폴더의 엑셀마다 사이드카가 없거나 원본 md5 와 다르면 새로 씀 → [(이름, 원본 KB, 사이드카 KB, 변환 ms 또는 None, 비고)]
+    # 사이드카가 원본보다 크면 쓰지 않음 (인원이 적은 파일은 엑셀이 더 작음)
+    results = []
+    for name in sorted(os.listdir(folder)):
+        if name.startswith(('.', '~$')) or not name.endswith(('.xlsx', '.xls')): continue
+        with open(os.path.join(folder, name), "rb") as f: content = f.read()
+        version = hashlib.md5(content).hexdigest()  # 드라이브 md5Checksum 과 같은 값
+        target = os.path.join(folder, name + SIDECAR_SUFFIX)
+        if not force and os.path.exists(target) and sidecar_source_version(target) == version:
+            results.append((name, len(content) / 1024, os.path.getsize(target) / 1024, None, "up-to-date")); continue
+        start = time.perf_counter()
+        body = build_sidecar(io.BytesIO(content), version, is_renewal_name(name))
+        ms = (time.perf_counter() - start) * 1000
+        if body is None:
+            results.append((name, len(content) / 1024, None, ms, "skip(빈 파일)")); continue
+        if len(body) >= len(content):
+            results.append((name, len(content) / 1024, len(body) / 1024, ms, "skip(원본보다 큼)")); continue
+        tmp = f"{target}.tmp"
+        with open(tmp, "wb") as f: f.write(body)
+        os.replace(tmp, target)
+        results.append((name, len(content) / 1024, len(body) / 1024, ms, "written"))
+    return results
+
+if __name__ == "__main__":
+    # 사용법: python leave_parser.py 폴더 [--force]   (드라이브 폴더를 동기화한 로컬 폴더 / PTO_LOCAL_DIR)
+    ap = argparse.ArgumentParser(description="월별/갱신 엑셀 → Parquet 사이드카 변환")
+    ap.add_argument("folder")
+    ap.add_argument("--force", action="store_true", help="원본이 그대로여도 다시 변환")
+    args = ap.parse_args()
+    print(f"{'file':24} {'xlsx(KB)':>9} {'parquet(KB)':>12} {'convert(ms)':>12}  result")
+    for name, src_kb, out_kb, ms, note in convert_folder(args.folder, args.force):
+        out = f"{out_kb:.1f}" if out_kb is not None else "-"
+        print(f"{name:24} {src_kb:>9.1f} {out:>12} {('-' if ms is None else f'{ms:.0f}'):>12}  {note}")
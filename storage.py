@@ -0,0 +1,241 @@
+# 저장소 백엔드 (구글 드라이브 / 로컬 폴더) 와 호출 보호 계층
+# - app.py 가 한 번 import 해서 사용 (스크립트가 rerun 마다 다시 실행돼도 캐시된 저장소 객체와 예외 클래스가 그대로 유지됨)
+# - DriveStorage   : 드라이브 폴더 (httplib2 클라이언트는 app.py 의 drive_session 풀에서 빌려 씀)
+# - LocalStorage   : 드라이브 폴더를 동기화한 로컬 디렉터리, 테스트용 가짜 폴더 (latency: 호출마다 넣을 지연, 초)
+# - GuardedStorage : 호출마다 제한 시간, 일시적 오류 재시도, 서킷 브레이커
+# 저장소 인터페이스: list_files() / get_metadata(id) / read_bytes(id) / write_bytes(id, body, mimetype, expected_version)
+#                    / create_bytes(name, body, mimetype) (폴더에 새 파일, 사이드카용)
+# 메타데이터는 드라이브 형식({id, name, modifiedTime, md5Checksum, size, version})으로 통일, 실패 시 예외
+# (여러 파일의 메타데이터는 list_files 가 목록 요청 한 번에 함께 받아 옴)
+
+import datetime
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+class StorageError(Exception):
+    # 재시도 후에도 읽기/쓰기 실패
+    pass
+
+class StorageUnavailable(StorageError):
+    # 서킷 브레이커가 열려 호출하지 않음
+    pass
+
+def write_atomic(path, write_fn):
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    write_fn(tmp)
+    os.replace(tmp, path)
+
+class DriveStorage:
+    def __init__(self, folder_id, session):
+        self.folder_id = folder_id
+        self.session = session  # with session() as service: 풀에서 빌린 드라이브 클라이언트 (없으면 None)
+
+    def list_files(self):
+        query = f"'{self.folder_id}' in parents and trashed=false"
+        all_files, page_token = [], None
+        with self.session() as service:
+            if not service: raise RuntimeError("드라이브 연결 실패")
+            while True:
+                results = service.files().list(q=query, pageSize=1000, pageToken=page_token,
+                                               fields="nextPageToken, files(id, name, modifiedTime, md5Checksum, size)").execute()
+                all_files.extend(results.get('files', []))
+                page_token = results.get('nextPageToken')
+                if not page_token: break
+        return all_files
+
+    def get_metadata(self, file_id):
+        with self.session() as service:
+            if not service: raise RuntimeError("드라이브 연결 실패")
+            return service.files().get(fileId=file_id, fields="id, name, modifiedTime, md5Checksum, size, version").execute()
+
+    def read_bytes(self, file_id):
+        with self.session() as service:
+            if not service: raise RuntimeError("드라이브 연결 실패")
+            return service.files().get_media(fileId=file_id).execute()
+
+    def write_bytes(self, file_id, body, mimetype, expected_version=None):
+        # 드라이브 v3 는 조건부(If-Match) 업데이트가 없으므로 업로드 직전에 버전이 그대로인지 다시 확인
+        # 버전이 바뀌었으면 None (호출 측이 최신본으로 다시 시도)
+        from googleapiclient.http import MediaIoBaseUpload
+        if expected_version is not None:
+            if self.get_metadata(file_id).get('version') != expected_version: return None
+        media = MediaIoBaseUpload(io.BytesIO(body), mimetype=mimetype)
+        with self.session() as service:
+            if not service: raise RuntimeError("드라이브 연결 실패")
+            return service.files().update(fileId=file_id, media_body=media, fields="id, version, modifiedTime, md5Checksum, size").execute()
+
+    def create_bytes(self, name, body, mimetype):
+        from googleapiclient.http import MediaIoBaseUpload
+        media = MediaIoBaseUpload(io.BytesIO(body), mimetype=mimetype)
+        with self.session() as service:
+            if not service: raise RuntimeError("드라이브 연결 실패")
+            return service.files().create(body={'name': name, 'parents': [self.folder_id]}, media_body=media,
+                                          fields="id, name, version, modifiedTime, md5Checksum, size").execute()
+
+class LocalStorage:
+    # 폴더 안의 파일 이름을 file_id 로 사용 (하위 폴더·숨김·임시 파일 제외)
+    def __init__(self, root, latency=0.0):
+        self.root = root
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.md5_cache = {}  # name -> ((mtime_ns, size), md5) : 안 바뀐 파일은 다시 해시하지 않음
+
+    def _path(self, file_id):
+        if not file_id or os.path.basename(file_id) != file_id: raise ValueError(f"잘못된 파일 ID: {file_id}")
+        return os.path.join(self.root, file_id)
+
+    def _meta(self, name):
+        path = self._path(name)
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = self.md5_cache.get(name)
+        if not cached or cached[0] != stamp:
+            with open(path, "rb") as f: cached = (stamp, hashlib.md5(f.read()).hexdigest())
+            self.md5_cache[name] = cached
+        modified = datetime.datetime.fromtimestamp(stat.st_mtime, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+        return {'id': name, 'name': name, 'modifiedTime': modified, 'md5Checksum': cached[1], 'size': str(stat.st_size),
+                'version': str(stat.st_mtime_ns)}
+
+    def _wait(self):
+        if self.latency: time.sleep(self.latency)
+
+    def list_files(self):
+        self._wait()
+        names = sorted(n for n in os.listdir(self.root)
+                       if not n.startswith(('.', '~$')) and not n.endswith('.tmp') and os.path.isfile(os.path.join(self.root, n)))
+        return [self._meta(n) for n in names]
+
+    def get_metadata(self, file_id):
+        self._wait()
+        return self._meta(file_id)
+
+    def read_bytes(self, file_id):
+        self._wait()
+        with open(self._path(file_id), "rb") as f: return f.read()
+
+    def write_bytes(self, file_id, body, mimetype, expected_version=None):
+        # 같은 프로세스 안에서는 확인과 쓰기를 한 잠금 안에서 수행 (진짜 조건부 쓰기)
+        path = self._path(file_id)
+        self._wait()
+        with self.lock:
+            if expected_version is not None:
+                try: current = self._meta(file_id)['version']
+                except OSError: current = None
+                if current != expected_version: return None
+            def write(p):
+                with open(p, "wb") as f: f.write(body)
+            write_atomic(path, write)
+            return self._meta(file_id)
+
+    def create_bytes(self, name, body, mimetype):
+        path = self._path(name)
+        self._wait()
+        with self.lock:
+            def write(p):
+                with open(p, "wb") as f: f.write(body)
+            write_atomic(path, write)
+            return self._meta(name)
+
+# 저장소 호출 보호: 호출마다 제한 시간, 일시적 오류는 지수 백오프(+지터)로 재시도,
+# 연속 실패가 쌓이면 서킷 브레이커를 열어 쿨다운 동안 드라이브를 부르지 않고 바로 실패 → 호출 측은 마지막으로 읽은 값 사용
+# 쿨다운이 끝나면 한 호출만 시험 삼아 보내고(half-open), 성공하면 닫고 실패하면 쿨다운을 두 배로 늘려 다시 열림
+STORAGE_RETRIES = 3
+STORAGE_BACKOFF = 0.5  # 초, 재시도마다 두 배
+BREAKER_THRESHOLD = 5  # 연속 실패 횟수
+BREAKER_COOLDOWN = 30  # 초
+BREAKER_COOLDOWN_MAX = 300
+
+def is_transient(e):
+    # 없는 파일·잘못된 요청은 재시도하지 않고 브레이커에도 세지 않음 (드라이브 403 은 주로 사용량 제한)
+    if isinstance(e, (FileNotFoundError, IsADirectoryError, ValueError)): return False
+    status = getattr(getattr(e, 'resp', None), 'status', None)
+    return status not in (400, 404)
+
+class GuardedStorage:
+    def __init__(self, storage, timeout=20.0, workers=8):
+        self.storage = storage
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.failures, self.trips, self.open_until, self.probing = 0, 0, 0.0, False
+        # 시간 초과된 호출은 소켓 타임아웃까지 작업 스레드에 남으므로 풀을 따로 둠
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pto-storage")
+
+    def list_files(self):
+        return self._call("list", self.storage.list_files)
+
+    def get_metadata(self, file_id):
+        return self._call("metadata", self.storage.get_metadata, file_id)
+
+    def read_bytes(self, file_id):
+        return self._call("read", self.storage.read_bytes, file_id)
+
+    def write_bytes(self, file_id, body, mimetype, expected_version=None):
+        return self._write("write", self.storage.write_bytes, file_id, body, mimetype, expected_version)
+
+    def create_bytes(self, name, body, mimetype):
+        return self._write("create", self.storage.create_bytes, name, body, mimetype)
+
+    def status(self):
+        with self.lock:
+            if self.failures < BREAKER_THRESHOLD: state = "closed"
+            elif self.probing or time.monotonic() >= self.open_until: state = "half-open"
+            else: state = "open"
+            return {'state': state, 'failures': self.failures, 'retry_in': max(0.0, self.open_until - time.monotonic())}
+
+    def _call(self, op, fn, *args):
+        delay = STORAGE_BACKOFF
+        for attempt in range(STORAGE_RETRIES):
+            probe = self._admit(op)
+            try: result = self.pool.submit(fn, *args).result(timeout=self.timeout)
+            except Exception as e:
+                self._failed(op, e, probe)
+                if probe or attempt == STORAGE_RETRIES - 1 or not is_transient(e):
+                    raise StorageError(f"{op}: {type(e).__name__}: {e}"[:200]) from e
+                time.sleep(delay * (1 + random.random()))
+                delay *= 2
+                continue
+            self._succeeded()
+            return result
+
+    def _write(self, op, fn, *args):
+        # 쓰기는 중복 업로드가 될 수 있으므로 재시도·시간 제한 없이 브레이커만 적용 (조건부 재시도는 호출 측에서)
+        probe = self._admit(op)
+        try: result = fn(*args)
+        except Exception as e:
+            self._failed(op, e, probe)
+            raise StorageError(f"{op} {args[0]}: {type(e).__name__}") from e
+        self._succeeded()
+        return result
+
+    def _admit(self, op):
+        # 통과하면 이번 호출이 half-open 시험 호출인지 반환, 열려 있으면 StorageUnavailable
+        with self.lock:
+            if self.failures < BREAKER_THRESHOLD: return False
+            if self.probing or time.monotonic() < self.open_until:
+                raise StorageUnavailable(f"{op}: 저장소 일시 차단 중")
+            self.probing = True
+            return True
+
+    def _failed(self, op, e, probe):
+        if not is_transient(e): return self._succeeded()  # 응답은 받았으므로 저장소는 살아 있음
+        with self.lock:
+            self.failures += 1
+            opened = probe or self.failures == BREAKER_THRESHOLD
+            if opened:
+                self.trips += 1
+                cooldown = min(BREAKER_COOLDOWN * 2 ** (self.trips - 1), BREAKER_COOLDOWN_MAX)
+                self.open_until = time.monotonic() + cooldown
+            self.probing = False
+        if opened:
+            logging.getLogger("pto").warning(json.dumps({'ts': datetime.datetime.utcnow().isoformat(timespec='milliseconds') + 'Z', 'event': "breaker.open",
+                                                         'op': op, 'error': type(e).__name__, 'cooldown_s': cooldown}, ensure_ascii=False))
+
+    def _succeeded(self):
+        with self.lock: self.failures, self.trips, self.probing = 0, 0, False
@@ -0,0 +1,129 @@
+# 엑셀 파서 벤치마크 (오프라인, 드라이브 불필요)
+# 사용법:
+#   python tests/bench_parser.py                                   # 기본 인원(50, 200, 1000)으로 측정
+#   python tests/bench_parser.py --headcounts 100 2000 --repeat 5
+#   python tests/bench_parser.py --record tests/bench_baseline.json   # 현재 결과를 기준값으로 저장
+#   python tests/bench_parser.py --compare tests/bench_baseline.json  # 기준값 대비 비교 (느려지거나 결과가 다르면 exit 1)
+# 측정 항목: fetch_excel 의 파싱 단계(parse_excel_content) 시간·최대 메모리, 월별 사용 행렬 크기, Parquet 사이드카 크기·복원 시간,
+#           기존 pandas 파서와의 결과 동일성
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import leave_parser
+from synthetic_workbooks import make_monthly_workbook, make_renewal_workbook
+
+MONTHLY_NAME = "2026_3월.xlsx"
+
+def measure(fn, content, repeat):
+    fn(io.BytesIO(content))  # 첫 호출(임포트·캐시 준비)은 측정에서 제외
+    times = []
+    for _ in range(repeat):
+        buf = io.BytesIO(content)
+        start = time.perf_counter()
+        result = fn(buf)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn(io.BytesIO(content))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, statistics.median(times), peak
+
+def digest(df):
+    return hashlib.sha1(df.to_csv(index=False).encode('utf-8')).hexdigest()
+
+def bench_case(kind, headcount, repeat, with_legacy):
+    if kind == "monthly":
+        content = make_monthly_workbook(headcount, 2026, 3)
+        fast = lambda b: leave_parser.parse_excel_content(b, MONTHLY_NAME)
+        legacy = lambda b: leave_parser.parse_monthly_sheet_legacy(b, MONTHLY_NAME)
+    else:
+        content = make_renewal_workbook(headcount)
+        fast = lambda b: leave_parser.parse_excel_content(b, is_renewal=True)
+        legacy = leave_parser.parse_renewal_sheet_legacy
+    df, seconds, peak = measure(fast, content, repeat)
+    row = {'kind': kind, 'headcount': headcount, 'bytes': len(content), 'rows': len(df),
+           'seconds': round(seconds, 5), 'peak_kb': round(peak / 1024, 1), 'digest': digest(df)}
+    if kind == "monthly":
+        m = leave_parser.parse_monthly_matrix(io.BytesIO(content))
+        row['matrix_kb'] = round((m.codes.nbytes + m.days.nbytes + m.remain.nbytes) / 1024, 1)
+    sidecar = leave_parser.build_sidecar(io.BytesIO(content), "bench", kind == "renewal")
+    start = time.perf_counter()
+    leave_parser.read_sidecar(sidecar, "bench", kind == "renewal")
+    row['sidecar_kb'] = round(len(sidecar) / 1024, 1)
+    row['sidecar_seconds'] = round(time.perf_counter() - start, 5)
+    if with_legacy:
+        df_legacy, legacy_seconds, legacy_peak = measure(legacy, content, repeat)
+        try:
+            pd.testing.assert_frame_equal(df, df_legacy)
+            row['equal'] = True
+        except AssertionError:
+            row['equal'] = False
+        row['legacy_seconds'] = round(legacy_seconds, 5)
+        row['legacy_peak_kb'] = round(legacy_peak / 1024, 1)
+    return row
+
+def print_table(rows, baseline=None):
+    print(f"{'kind':8} {'people':>7} {'rows':>6} {'parse(s)':>9} {'peak(KB)':>9} {'matrix(KB)':>10} {'sidecar(KB)':>11} {'sidecar(s)':>10} {'legacy(s)':>10} {'equal':>6} {'vs base':>8}")
+    for r in rows:
+        legacy = f"{r['legacy_seconds']:.4f}" if 'legacy_seconds' in r else "-"
+        equal = str(r.get('equal', '-'))
+        ratio = "-"
+        base = (baseline or {}).get(f"{r['kind']}:{r['headcount']}")
+        if base: ratio = f"{r['seconds'] / base['seconds']:.2f}x"
+        print(f"{r['kind']:8} {r['headcount']:>7} {r['rows']:>6} {r['seconds']:>9.4f} {r['peak_kb']:>9.1f} {r.get('matrix_kb', '-'):>10} {r['sidecar_kb']:>11} {r['sidecar_seconds']:>10.4f} {legacy:>10} {equal:>6} {ratio:>8}")
+
+def main():
+    ap = argparse.ArgumentParser(description="월별/갱신 엑셀 파서 벤치마크")
+    ap.add_argument("--headcounts", type=int, nargs="+", default=[50, 200, 1000])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--no-legacy", action="store_true", help="기존 pandas 파서 비교 생략")
+    ap.add_argument("--record", metavar="FILE", help="결과를 기준값 JSON 으로 저장")
+    ap.add_argument("--compare", metavar="FILE", help="기준값 JSON 과 비교")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="허용 성능 저하 비율 (기본 25%%)")
+    args = ap.parse_args()
+
+    rows = []
+    for headcount in args.headcounts:
+        for kind in ("monthly", "renewal"):
+            rows.append(bench_case(kind, headcount, args.repeat, not args.no_legacy))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f: baseline = json.load(f)['results']
+    print_table(rows, baseline)
+
+    failed = [r for r in rows if r.get('equal') is False]
+    for r in failed: print(f"[FAIL] {r['kind']} {r['headcount']}명: 기존 파서와 결과가 다름")
+    if baseline:
+        for r in rows:
+            base = baseline.get(f"{r['kind']}:{r['headcount']}")
+            if not base: continue
+            if base['digest'] != r['digest']:
+                print(f"[FAIL] {r['kind']} {r['headcount']}명: 기준값과 파싱 결과가 다름"); failed.append(r)
+            elif r['seconds'] > base['seconds'] * (1 + args.tolerance):
+                print(f"[FAIL] {r['kind']} {r['headcount']}명: {base['seconds']:.4f}s → {r['seconds']:.4f}s"); failed.append(r)
+
+    if args.record:
+        meta = {'python': platform.python_version(), 'pandas': pd.__version__, 'machine': platform.machine(),
+                'recorded_at': time.strftime("%Y-%m-%d %H:%M:%S")}
+        with open(args.record, "w", encoding="utf-8") as f:
+            json.dump({'meta': meta, 'results': {f"{r['kind']}:{r['headcount']}": r for r in rows}}, f, ensure_ascii=False, indent=2)
+        print(f"기준값 저장: {args.record}")
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# 앱 잠깨기 + 캐시 예열 (브라우저 없이 HTTP 요청만 사용, 표준 라이브러리만 필요)
+# 1) /_stcore/health               : 서버가 떠 있는지 확인
+# 2) /_stcore/script-health-check  : 서버에서 app.py 를 한 번 실행 → start_warmup() 이 목록 조회·현재 파일 파싱을 백그라운드로 시작
+# 3) /app/static/warmup.json        : 예열이 끝날 때까지 기다렸다가 단계별 소요 시간 출력
+# 사용법: python tests/keep_warm.py [URL]   (URL 생략 시 환경 변수 APP_URL, 없으면 운영 앱 주소)
+# 서버가 응답하지 않으면 exit 1 (워크플로에서 브라우저 방식 wake_up.py 로 대체)
+
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+
+DEFAULT_URL = "https://auction1-pto-check-yoco6lndlsgq4pubmtqw3h.streamlit.app/"
+# 커뮤니티 클라우드는 앱 서버가 /~/+/ 아래에 있음
+PREFIXES = ["~/+/", ""]
+WARMUP_WAIT = 120  # 초
+
+def get(url, timeout=30):
+    req = urllib.request.Request(url, headers={"User-Agent": "pto-keep-warm", "Cache-Control": "no-cache"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as res:
+            return res.status, res.read().decode("utf-8", "replace")
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode("utf-8", "replace")
+    except Exception as e:
+        return None, str(e)
+
+def find_base(url):
+    for prefix in PREFIXES:
+        start = time.perf_counter()
+        status, body = get(url + prefix + "_stcore/health")
+        if status == 200 and body.strip() == "ok":
+            print(f"health ok ({(time.perf_counter() - start) * 1000:.0f}ms) - {url + prefix}")
+            return url + prefix
+        print(f"health {status} - {url + prefix}: {body[:80]!r}")
+    return None
+
+def keep_warm(url):
+    url = url if url.endswith("/") else url + "/"
+    base = find_base(url)
+    if not base: return False
+
+    requested = time.time()
+    start = time.perf_counter()
+    status, body = get(base + "_stcore/script-health-check", timeout=90)
+    print(f"script run {status} {body.strip()[:40]!r} ({(time.perf_counter() - start) * 1000:.0f}ms)")
+
+    # 예열은 1분에 한 번만 다시 돌므로, 직전에 끝난 예열 결과도 인정
+    deadline = time.time() + WARMUP_WAIT
+    while time.time() < deadline:
+        status, body = get(f"{base}app/static/warmup.json?t={int(time.time())}")
+        if status == 200:
+            try: warm = json.loads(body)
+            except ValueError: warm = None
+            if warm and warm.get("finished", 0) >= requested - 90:
+                print(f"warm-up {'ok' if warm.get('ok') else 'incomplete'}: {warm.get('total_ms')}ms, "
+                      f"monthly files {warm.get('monthly_files')}, storage {warm.get('storage')}, error {warm.get('error')}")
+                for name, ms in warm.get("steps", {}).items(): print(f"  {name:20} {ms:>9.1f}ms")
+                return True
+        time.sleep(3)
+    print("warm-up status not available (server is up, caches may still be cold)")
+    return True
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("APP_URL", DEFAULT_URL)
+    sys.exit(0 if keep_warm(target) else 1)
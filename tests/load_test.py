@@ -0,0 +1,225 @@
+# 동시 접속 부하 테스트 (드라이브 대신 호출마다 지연을 넣은 로컬 폴더 사용, 브라우저·드라이브 불필요)
+# 사용법:
+#   python tests/load_test.py                                          # 기본: 세션 20개, 동시 8개, 저장소 지연 150ms
+#   python tests/load_test.py --sessions 60 --concurrency 30 --latency 300 --headcount 300 --months 12
+#   python tests/load_test.py --record tests/load_baseline.json          # 현재 결과를 기준값으로 저장
+#   python tests/load_test.py --compare tests/load_baseline.json         # 기준값 대비 비교 (느려지거나 호출이 늘면 exit 1)
+# 세션 하나 = streamlit AppTest 하나 (브라우저 탭 하나): 접속 → 로그인 → 월별 탭 → 월 바꾸기 → 갱신 탭 → 잔여 탭
+# 측정 항목: 단계별 rerun 지연(p50/p95/p99), 처리량, 저장소 호출 수(앱 계측 로그 "pto" 의 storage.* 구간), 메모리(RSS)
+# 캐시는 프로세스 공용이므로 서버 한 대에 사무실 전체가 동시에 접속한 상황과 같음 (앞쪽 세션들이 콜드 캐시를 맞음, --warm 으로 제외 가능)
+# AppTest 를 동시에 돌리려고 streamlit 내부(Runtime, ScriptCache, 설정 패치)를 바꿔 끼우므로 requirements.txt 에 고정한 버전에서만 실행
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic_workbooks import employee_names, make_monthly_workbook, make_renewal_workbook
+
+APP = os.path.join(ROOT, "app.py")
+STREAMLIT_VERSION = "1.66.0"  # share_apptest_runtime 을 맞춘 버전 (requirements.txt 와 같이 올릴 것)
+PASSWORD = "1234"
+STEPS = ["open", "login", "tab.monthly", "month.select", "tab.renewal", "tab.summary"]
+
+def make_folder(folder, headcount, months, year, month):
+    # 드라이브 폴더와 같은 구성: 월별 엑셀(최신 달부터 거꾸로), 갱신 엑셀, 사용자 DB, 실시간 사용 내역
+    names = employee_names(headcount)
+    for i in range(months):
+        y, m = year, month - i
+        while m < 1: y, m = y - 1, m + 12
+        with open(os.path.join(folder, f"{y}_{m}월.xlsx"), "wb") as f: f.write(make_monthly_workbook(headcount, y, m))
+    with open(os.path.join(folder, "연차갱신.xlsx"), "wb") as f: f.write(make_renewal_workbook(headcount, year))
+    pw = hashlib.sha256(PASSWORD.encode()).hexdigest()
+    user_db = {n: {'pw': pw, 'title': '사원', 'role': 'user'} for n in names}
+    realtime = {'__last_updated__': f"{year}-{month:02d}-01 09:00"}
+    realtime.update({n: {'used': 1.0, 'details': '2일(연차)'} for n in names[::7]})
+    for name, data in (("user_db.json", user_db), ("realtime_usage.json", realtime)):
+        with open(os.path.join(folder, name), "w", encoding="utf-8") as f: json.dump(data, f, ensure_ascii=False)
+    return names
+
+class SpanCounter(logging.Handler):
+    # 앱 계측 로그(JSON 한 줄)를 받아 구간 이름별로 셈 (앱이 자기 출력 핸들러를 달지 않도록 먼저 붙여 둠)
+    # emit 은 Handler.handle 이 핸들러 잠금을 잡은 채로 부름
+    def __init__(self):
+        super().__init__()
+        self.counts = Counter()
+
+    def emit(self, record):
+        try: entry = json.loads(record.getMessage())
+        except ValueError: return
+        name = entry.get('span') or entry.get('event')
+        if name == "storage.read" and entry.get('sidecar'): name = "storage.read.sidecar"
+        self.counts[name] += 1
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError): return float('nan')
+
+def percentile(values, p):
+    if not values: return float('nan')
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def share_apptest_runtime():
+    # AppTest 는 실행할 때마다 전역 Runtime(가짜)과 설정 패치를 만들었다가 지우고 스크립트도 새로 파싱하므로,
+    # 여러 스레드에서 동시에 돌리면 다른 세션 실행 도중에 Runtime 이 사라지거나 파서가 충돌함
+    # → 실제 서버처럼 Runtime·스크립트 캐시·설정을 프로세스에 하나만 두도록 바꿈 (이 스크립트 안에서만)
+    import streamlit
+    if streamlit.__version__ != STREAMLIT_VERSION:
+        sys.exit(f"streamlit {streamlit.__version__}: 이 부하 테스트는 streamlit {STREAMLIT_VERSION} 의 내부 구조에 맞춰져 있음 (share_apptest_runtime 확인 후 STREAMLIT_VERSION 갱신)")
+    from contextlib import nullcontext
+    from unittest.mock import MagicMock
+    from streamlit.runtime import Runtime
+    from streamlit.testing.v1 import app_test, local_script_runner
+    from streamlit.testing.v1.util import patch_config_options
+    shared = MagicMock(spec=Runtime)
+    shared.media_file_mgr = app_test.MediaFileManager(app_test.MemoryMediaFileStorage("/mock/media"))
+    shared.dataframe_source_mgr = app_test.DataframeSourceManager()
+    shared.cache_storage_manager = app_test.MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: cls._instance or shared)
+    Runtime.exists = classmethod(lambda cls: True)
+    script_cache = app_test.ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+    app_test.patch_config_options = lambda overrides: nullcontext()
+    return patch_config_options({"global.appTest": True})
+
+def run_session(name, timeout, month_picks, timings, errors):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP, default_timeout=timeout)
+    def step(label, action):
+        start = time.perf_counter()
+        action()
+        timings[label].append((time.perf_counter() - start) * 1000)
+        if at.exception: raise RuntimeError(f"{label}: {at.exception[0].message}")
+    try:
+        step("open", at.run)
+        at.text_input[0].input(name); at.text_input[1].input(PASSWORD)
+        step("login", at.button[0].click().run)
+        if not at.session_state['login_status']: raise RuntimeError("login: 로그인 실패")
+        at.session_state['main_tab'] = "📅 월별"
+        step("tab.monthly", at.run)
+        months = [s for s in at.selectbox if s.label == "월 선택"]
+        for option in (months[0].options[1:1 + month_picks] if months else []):
+            step("month.select", [s for s in at.selectbox if s.label == "월 선택"][0].set_value(option).run)
+        at.session_state['main_tab'] = "🔄 갱신"
+        step("tab.renewal", at.run)
+        at.session_state['main_tab'] = "📌 잔여"
+        step("tab.summary", at.run)
+    except Exception as e: errors.append(f"{name}: {type(e).__name__}: {e}"[:200])
+
+def run_load(args):
+    folder = tempfile.mkdtemp(prefix="pto-load-")
+    try:
+        names = make_folder(folder, args.headcount, args.months, args.year, args.month)
+        os.environ.update({'PTO_STORAGE': "local", 'PTO_LOCAL_DIR': folder, 'PTO_LOCAL_LATENCY': str(args.latency),
+                           'PTO_SNAPSHOT_DIR': os.path.join(folder, ".snapshot"), 'PTO_METRICS': "1"})
+        counter = SpanCounter()
+        logger = logging.getLogger("pto")
+        logger.addHandler(counter); logger.setLevel(logging.INFO); logger.propagate = False
+        # 세션 스레드·앱 백그라운드 스레드마다 찍히는 "missing ScriptRunContext" 경고 생략 (설정을 먼저 읽어 둬야 덮어쓰이지 않음)
+        from streamlit import config, logger as st_logger
+        config.get_config_options()
+        st_logger.set_log_level("error")
+
+        with share_apptest_runtime():
+            if args.warm: run_session(names[0], args.timeout, args.month_picks, defaultdict(list), [])
+            counter.counts.clear()
+            timings, errors = defaultdict(list), []
+            rss_start = rss_mb()
+            start = time.perf_counter()
+            users = [names[i % len(names)] for i in range(args.sessions)]
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                list(pool.map(lambda u: run_session(u, args.timeout, args.month_picks, timings, errors), users))
+            wall = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # 리눅스: KB
+        for message in errors[:5]: print(f"[ERROR] {message}")
+        return timings, errors, counter.counts, wall, rss_start, rss_mb(), peak
+    finally:
+        if not args.keep: shutil.rmtree(folder, ignore_errors=True)
+        else: print(f"테스트 폴더: {folder}")
+
+def summarize(timings, errors, counts, wall, rss_start, rss_end, peak, args):
+    every = [ms for label in STEPS for ms in timings.get(label, [])]
+    steps = {}
+    for label in STEPS + ["all"]:
+        values = every if label == "all" else timings.get(label, [])
+        if values: steps[label] = {'count': len(values), 'p50': round(percentile(values, 50), 1), 'p95': round(percentile(values, 95), 1),
+                                   'p99': round(percentile(values, 99), 1), 'max': round(max(values), 1)}
+    storage = {k: v for k, v in sorted(counts.items()) if k and k.startswith("storage.")}
+    return {'sessions': args.sessions, 'concurrency': args.concurrency, 'latency_ms': args.latency, 'headcount': args.headcount,
+            'months': args.months, 'errors': len(errors), 'wall_s': round(wall, 2), 'reruns_per_s': round(len(every) / wall, 2),
+            'steps': steps, 'storage': storage, 'parse': counts.get("parse", 0), 'breaker_open': counts.get("breaker.open", 0),
+            'rss_start_mb': round(rss_start, 1), 'rss_end_mb': round(rss_end, 1), 'rss_peak_mb': round(peak, 1)}
+
+def print_report(result, baseline=None):
+    print(f"{'step':14} {'count':>6} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9} {'max(ms)':>9} {'vs base p95':>12}")
+    for label, s in result['steps'].items():
+        base = (baseline or {}).get('steps', {}).get(label)
+        ratio = f"{s['p95'] / base['p95']:.2f}x" if base and base['p95'] else "-"
+        print(f"{label:14} {s['count']:>6} {s['p50']:>9.1f} {s['p95']:>9.1f} {s['p99']:>9.1f} {s['max']:>9.1f} {ratio:>12}")
+    print(f"세션 {result['sessions']}개 (동시 {result['concurrency']}, 저장소 지연 {result['latency_ms']}ms, {result['headcount']}명 × {result['months']}개월)"
+          f" · 오류 {result['errors']} · {result['wall_s']}s · {result['reruns_per_s']} reruns/s")
+    print("저장소 호출: " + (", ".join(f"{k.split('.', 1)[1]} {v}" for k, v in result['storage'].items()) or "-")
+          + f" · 파싱 {result['parse']} · 브레이커 열림 {result['breaker_open']}")
+    print(f"메모리(RSS): 시작 {result['rss_start_mb']}MB → 종료 {result['rss_end_mb']}MB (최대 {result['rss_peak_mb']}MB)")
+
+def main():
+    ap = argparse.ArgumentParser(description="동시 세션 부하 테스트 (AppTest + 지연 있는 로컬 저장소)")
+    ap.add_argument("--sessions", type=int, default=20)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--latency", type=float, default=150, help="저장소 호출당 지연(ms)")
+    ap.add_argument("--headcount", type=int, default=100)
+    ap.add_argument("--months", type=int, default=6)
+    ap.add_argument("--month-picks", type=int, default=2, help="세션마다 월별 탭에서 바꿔 볼 달 수")
+    ap.add_argument("--year", type=int, default=2026)
+    ap.add_argument("--month", type=int, default=3, help="가장 최근 월별 파일의 달")
+    ap.add_argument("--timeout", type=float, default=120, help="rerun 한 번의 제한 시간(초)")
+    ap.add_argument("--warm", action="store_true", help="측정 전에 세션 하나로 캐시를 채움 (콜드 스타트 제외)")
+    ap.add_argument("--keep", action="store_true", help="테스트 폴더를 지우지 않음")
+    ap.add_argument("--record", metavar="FILE", help="결과를 기준값 JSON 으로 저장")
+    ap.add_argument("--compare", metavar="FILE", help="기준값 JSON 과 비교")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="허용 성능 저하 비율 (기본 25%%)")
+    args = ap.parse_args()
+
+    result = summarize(*run_load(args), args)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f: baseline = json.load(f)['result']
+    print_report(result, baseline)
+
+    failed = []
+    if result['errors']: failed.append(f"세션 오류 {result['errors']}건")
+    if baseline:
+        p95, base_p95 = result['steps'].get('all', {}).get('p95', 0), baseline['steps'].get('all', {}).get('p95', 0)
+        if base_p95 and p95 > base_p95 * (1 + args.tolerance): failed.append(f"p95 {base_p95:.0f}ms → {p95:.0f}ms")
+        if result['reruns_per_s'] < baseline['reruns_per_s'] * (1 - args.tolerance):
+            failed.append(f"처리량 {baseline['reruns_per_s']} → {result['reruns_per_s']} reruns/s")
+        calls, base_calls = sum(result['storage'].values()), sum(baseline['storage'].values())
+        if calls > base_calls * (1 + args.tolerance): failed.append(f"저장소 호출 {base_calls} → {calls}")
+    for reason in failed: print(f"[FAIL] {reason}")
+
+    if args.record:
+        import streamlit
+        meta = {'python': platform.python_version(), 'streamlit': streamlit.__version__, 'machine': platform.machine(), 'cpus': os.cpu_count(),
+                'recorded_at': time.strftime("%Y-%m-%d %H:%M:%S")}
+        with open(args.record, "w", encoding="utf-8") as f: json.dump({'meta': meta, 'result': result}, f, ensure_ascii=False, indent=2)
+        print(f"기준값 저장: {args.record}")
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
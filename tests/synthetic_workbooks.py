@@ -0,0 +1,47 @@
+# 벤치마크 / 부하 테스트용 가짜 엑셀 생성기
+# 실제 드라이브 파일과 같은 배치로 만든다.
+# - 월별: 제목 2줄 → '성 명' 헤더 행(일자 1~말일, '연차 잔여일') → 직원마다 2행 (근태 행 + 바로 아래 행에 잔여일 값)
+# - 갱신: 1행 제목, 2행 A열 연도, 4행 헤더(이름/월/일/올해발생연차개수)
+
+import calendar
+import io
+import random
+
+from openpyxl import Workbook
+
+LEAVE_CELLS = ['연차', '연차', '반차', '오전반차', '오후반차', '여름휴가', '경조휴가']
+OTHER_CELLS = ['출근', '재택', '외근', None, None, None]
+
+def employee_names(headcount):
+    family = ['김', '이', '박', '최', '정', '강', '조', '윤', '장', '임']
+    return [f"{family[i % len(family)]}직원{i:04d}" for i in range(headcount)]
+
+def make_monthly_workbook(headcount, year=2026, month=1, seed=0, leave_rate=0.06):
+    rng = random.Random(seed * 1000 + month)
+    days = calendar.monthrange(year, month)[1]
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("근태")
+    ws.append([f"{year}년 {month}월 근태 현황"])
+    ws.append(["옥션원 서울지사"])
+    ws.append(["No", "성 명", "직급"] + list(range(1, days + 1)) + ["연차 잔여일", "비고"])
+    for i, name in enumerate(employee_names(headcount)):
+        cells = [rng.choice(LEAVE_CELLS) if rng.random() < leave_rate else rng.choice(OTHER_CELLS) for _ in range(days)]
+        ws.append([i + 1, name, "사원"] + cells + [None, None])
+        ws.append([None, None, None] + [None] * days + [rng.randint(0, 40) / 2, None])
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+def make_renewal_workbook(headcount, year=2026, seed=0):
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("갱신")
+    ws.append(["연차 갱신 현황"])
+    ws.append([year])
+    ws.append([])
+    ws.append(["이름", "월", "일", "올해발생\n연차개수"])
+    for name in employee_names(headcount):
+        ws.append([name, rng.randint(1, 12), rng.randint(1, 28), rng.randint(15, 25)])
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()